@@ -1,9 +1,25 @@
+import os
 import random
+import sys
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 
-def generate_sudoku(difficulty):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from puzzlegen import killer_solver, metrics, sudoku_grader, sudoku_solver
+from puzzlegen.batch import iter_batch
+from puzzlegen.render import sudoku_grid_form
+
+# Score bands (see puzzlegen.sudoku_grader) for rated generation: easy needs
+# only hidden singles, medium adds naked singles and box/line interactions,
+# hard needs pairs, triples, X-wings or swordfish
+RATING_BANDS = {
+    'easy': (1.0, 1.5),
+    'medium': (2.3, 2.8),
+    'hard': (3.0, 4.0)
+}
+
+def generate_solution():
     base = 3
     side = base * base
 
@@ -18,7 +34,23 @@ def generate_sudoku(difficulty):
     nums = shuffle(range(1, base * base + 1))
 
     # Produce board using randomized baseline pattern
-    board = [[nums[pattern(r,c)] for c in cols] for r in rows]
+    return [[nums[pattern(r,c)] for c in cols] for r in rows]
+
+def generate_sudoku(difficulty, unique=False, rated=False):
+    if rated:
+        # Dig by human-technique score rather than hole count, starting over
+        # from a fresh solution whenever the band can't be reached
+        if difficulty not in RATING_BANDS:
+            raise ValueError("Invalid difficulty level")
+        while True:
+            solution = generate_solution()
+            puzzle = sudoku_grader.dig_rated(solution, *RATING_BANDS[difficulty])
+            if puzzle is not None:
+                return puzzle, solution
+            metrics.count('killer.rated_restarts')
+
+    board = generate_solution()
+    side = len(board)
 
     # Determine number of empty squares based on difficulty
     if difficulty == 'easy':
@@ -31,104 +63,244 @@ def generate_sudoku(difficulty):
         raise ValueError("Invalid difficulty level")
 
     squares = side * side
+    if unique:
+        # Remove clues one at a time, keeping a removal only while the puzzle
+        # still has exactly one solution. Stops early if no further clue can go.
+        solution = [row[:] for row in board]
+        removed = 0
+        for p in random.sample(range(squares), squares):
+            if removed == no_of_holes:
+                break
+            row, col = p // side, p % side
+            board[row][col] = 0
+            if sudoku_solver.count_solutions(board, limit=2) == 1:
+                removed += 1
+            else:
+                board[row][col] = solution[row][col]
+        return board, solution
+
     for p in random.sample(range(squares), no_of_holes):
         board[p // side][p % side] = 0
     
     return board, solve_sudoku([row[:] for row in board])
 
-def solve_sudoku(board):
-    side = len(board)
-
-    def find_empty_location(board):
-        for row in range(side):
-            for col in range(side):
-                if board[row][col] == 0:
-                    return row, col
-        return None
-    
-    def is_safe(board, row, col, num):
-        for x in range(side):
-            if board[row][x] == num or board[x][col] == num:
-                return False
-        start_row, start_col = 3 * (row // 3), 3 * (col // 3)
-        for i in range(3):
-            for j in range(3):
-                if board[i + start_row][j + start_col] == num:
-                    return False
-        return True
-    
-    def solve(board):
-        empty_loc = find_empty_location(board)
-        if not empty_loc:
-            return True
-        row, col = empty_loc
-        for num in range(1, side + 1):
-            if is_safe(board, row, col, num):
-                board[row][col] = num
-                if solve(board):
-                    return True
-                board[row][col] = 0
-        return False
-    
-    solve(board)
+def solve_sudoku(board, engine='bitmask', cages=None):
+    # Fill board in place, leaving it unchanged if it cannot be solved.
+    # engine is one of sudoku_solver.ENGINES; passing cages also enforces the
+    # Killer cage sums, so board may then have no givens at all.
+    solution = sudoku_solver.solve(board, engine, cages)
+    if solution is not None:
+        for row, solved_row in zip(board, solution):
+            row[:] = solved_row
     return board
 
-def generate_cages(solution_board):
+# Relative weights of each cage size; by default sizes 1-5 are equally likely
+CAGE_SIZE_WEIGHTS = {1: 1, 2: 1, 3: 1, 4: 1, 5: 1}
+
+def generate_cages(solution_board, size_weights=None):
     side = len(solution_board)
+    size_weights = size_weights or CAGE_SIZE_WEIGHTS
+    sizes, weights = list(size_weights), list(size_weights.values())
     cages = []
-    visited_cells = set()
-    cage_id = 1
 
-    while len(visited_cells) < side * side:
-        cage_size = random.randint(1, 5)  # Adjust size as needed
-        cage_cells = set()
-        cage_numbers = set()
+    # Unvisited cells are kept in a list with an index map, so a random start
+    # cell is drawn and removed in O(1) instead of by rejection sampling
+    unvisited = [(r, c) for r in range(side) for c in range(side)]
+    position = {cell: i for i, cell in enumerate(unvisited)}
 
-        # Randomly pick a starting cell that has not been visited
-        start_row, start_col = random.randint(0, side - 1), random.randint(0, side - 1)
-        if (start_row, start_col) in visited_cells:
-            continue
-        cage_cells.add((start_row, start_col))
-        cage_numbers.add(solution_board[start_row][start_col])
-
-        # Use a list to explore adjacent cells and form a cage
-        stack = [(start_row, start_col)]
-        while stack and len(cage_cells) < cage_size:
-            r, c = stack.pop()
-            for dr, dc in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                nr, nc = r + dr, c + dc
-                if (0 <= nr < side and 0 <= nc < side and (nr, nc) not in visited_cells
-                        and (nr, nc) not in cage_cells and solution_board[nr][nc] not in cage_numbers):
-                    cage_cells.add((nr, nc))
-                    cage_numbers.add(solution_board[nr][nc])
-                    stack.append((nr, nc))
-                    if len(cage_cells) == cage_size:
-                        break
-
-        if cage_cells:
-            cage_sum = sum(solution_board[r][c] for r, c in cage_cells)
-            cages.append({'id': cage_id, 'cells': list(cage_cells), 'sum': cage_sum})
-            visited_cells.update(cage_cells)
-            cage_id += 1
+    def visit(cell):
+        i = position.pop(cell)
+        last = unvisited.pop()
+        if i < len(unvisited):
+            unvisited[i] = last
+            position[last] = i
+
+    rejected = 0
+    while unvisited:
+        cage_size = random.choices(sizes, weights)[0]
+        start = random.choice(unvisited)
+        visit(start)
+        cage_cells = [start]
+        used_digits = 1 << solution_board[start[0]][start[1]]
+
+        # Grow the cage from a frontier of unvisited neighbours, picking a
+        # random one each step. A cell whose digit is already in the cage is
+        # dropped for this cage, so every cell is examined a bounded number
+        # of times and the whole partition stays linear in the board size.
+        frontier = []
+        seen = {start}
+        added = start
+        while len(cage_cells) < cage_size:
+            if added:
+                r, c = added
+                for neighbour in ((r, c + 1), (r + 1, c), (r, c - 1), (r - 1, c)):
+                    if neighbour in position and neighbour not in seen:
+                        seen.add(neighbour)
+                        frontier.append(neighbour)
+                added = None
+            if not frontier:
+                break
+            i = random.randrange(len(frontier))
+            frontier[i], frontier[-1] = frontier[-1], frontier[i]
+            candidate = frontier.pop()
+            digit = 1 << solution_board[candidate[0]][candidate[1]]
+            if used_digits & digit:
+                rejected += 1
+                continue
+            visit(candidate)
+            cage_cells.append(candidate)
+            used_digits |= digit
+            added = candidate
 
+        cage_sum = sum(solution_board[r][c] for r, c in cage_cells)
+        cages.append({'id': len(cages) + 1, 'cells': cage_cells, 'sum': cage_sum})
+
+    metrics.count('killer.rejected_cells', rejected)
     return cages
 
-def create_pdf(puzzles, solutions, filename_puzzles, filename_solutions):
+# Random merges of neighbouring cages tried once a layout is unique. Every
+# merge that keeps the puzzle unique leaves fewer, larger cages.
+MERGE_ATTEMPTS = {
+    'easy': 0,
+    'medium': 30,
+    'hard': 90
+}
+MAX_MERGED_CAGE_SIZE = 6
+# Search nodes a uniqueness check may spend on a trial merge before the
+# merge is given up on; ambiguous layouts can otherwise take seconds to refute
+MERGE_NODE_LIMIT = 300
+
+def _cage_neighbours(cells):
+    for r, c in cells:
+        yield from ((r, c + 1), (r + 1, c), (r, c - 1), (r - 1, c))
+
+def _is_connected(cells):
+    cells = set(cells)
+    start = next(iter(cells))
+    stack, seen = [start], {start}
+    while stack:
+        for neighbour in _cage_neighbours([stack.pop()]):
+            if neighbour in cells and neighbour not in seen:
+                seen.add(neighbour)
+                stack.append(neighbour)
+    return len(seen) == len(cells)
+
+def _split_cage(cells, cell):
+    # Split a cage into two connected parts, the first grown outward from cell
+    cells = set(cells)
+    for size in random.sample(range(1, len(cells)), len(cells) - 1):
+        part, queue = [cell], [cell]
+        while queue and len(part) < size:
+            for neighbour in _cage_neighbours([queue.pop(0)]):
+                if neighbour in cells and neighbour not in part and len(part) < size:
+                    part.append(neighbour)
+                    queue.append(neighbour)
+        rest = [c for c in cells if c not in part]
+        if _is_connected(rest):
+            return part, rest
+
+def generate_unique_killer(difficulty, givens=0, size_weights=None):
+    # Build a Killer puzzle whose cages plus `givens` revealed digits have
+    # exactly one solution, returning (puzzle, solution, cages)
+    if difficulty not in MERGE_ATTEMPTS:
+        raise ValueError("Invalid difficulty level")
+    solution = generate_solution()
+    side = len(solution)
+    cages = [cage['cells'] for cage in generate_cages(solution, size_weights)]
+
+    puzzle = [[0] * side for _ in range(side)]
+    for p in random.sample(range(side * side), givens):
+        puzzle[p // side][p % side] = solution[p // side][p % side]
+
+    def as_dicts(layout):
+        return [{'id': i + 1, 'cells': cells, 'sum': sum(solution[r][c] for r, c in cells)}
+                for i, cells in enumerate(layout)]
+
+    # Split a cage where a second solution disagrees with ours until only
+    # one solution is left. A one-cell cage fixes its digit, so the cage
+    # being split always has at least two cells.
+    while True:
+        found = killer_solver.solutions(puzzle, as_dicts(cages), 2)
+        if len(found) == 1:
+            break
+        other = found[1] if found[0] == solution else found[0]
+        cell = random.choice([(r, c) for r in range(side) for c in range(side)
+                              if other[r][c] != solution[r][c]])
+        index = next(i for i, cells in enumerate(cages) if cell in cells)
+        cages[index:index + 1] = _split_cage(cages[index], cell)
+        metrics.count('killer.splits')
+
+    # Merge neighbouring cages (whose digits stay distinct) while the
+    # puzzle remains unique
+    merged_count = limited = 0
+    for _ in range(MERGE_ATTEMPTS[difficulty]):
+        index = random.randrange(len(cages))
+        cells = cages[index]
+        neighbours = [i for i, other in enumerate(cages) if i != index
+                      and any(n in other for n in _cage_neighbours(cells))]
+        if not neighbours:
+            continue
+        other = random.choice(neighbours)
+        merged = cells + cages[other]
+        if (len(merged) > MAX_MERGED_CAGE_SIZE
+                or len({solution[r][c] for r, c in merged}) != len(merged)):
+            continue
+        trial = [cage for i, cage in enumerate(cages) if i not in (index, other)] + [merged]
+        try:
+            if killer_solver.count_solutions(puzzle, as_dicts(trial), 2, MERGE_NODE_LIMIT) == 1:
+                cages = trial
+                merged_count += 1
+        except killer_solver.SearchLimitExceeded:
+            limited += 1
+
+    metrics.count('killer.merge_attempts', MERGE_ATTEMPTS[difficulty])
+    metrics.count('killer.merges', merged_count)
+    metrics.count('killer.node_limit_hits', limited)
+    return puzzle, solution, as_dicts(cages)
+
+def generate_puzzle(difficulty, unique=None, rated=False, givens=None):
+    # One unit of batch work (see puzzlegen.batch): puzzle, solution and cages.
+    # Passing givens builds a cage-verified unique puzzle with that many digits
+    # shown; it is always unique, and digs no holes to rate. unique defaults
+    # to False without givens.
+    if givens is not None:
+        if unique is False:
+            raise ValueError("Puzzles with givens are always unique")
+        if rated:
+            raise ValueError("Rated generation is not available with givens")
+        if not 0 <= givens <= 81:
+            raise ValueError("givens must be between 0 and 81")
+        return generate_unique_killer(difficulty, givens)
+    puzzle, solution = generate_sudoku(difficulty, bool(unique), rated)
+    return puzzle, solution, generate_cages(solution)
+
+def create_pdf(puzzles, solutions, filename_puzzles, filename_solutions, cages_list=None):
+    if cages_list is None:
+        cages_list = (generate_cages(solution) for solution in solutions)
+    write_pdf(zip(puzzles, solutions, cages_list), filename_puzzles, filename_solutions)
+
+def write_pdf(entries, filename_puzzles, filename_solutions):
+    # Draw each (puzzle, solution, cages) entry as soon as it arrives, so
+    # entries can be a generator (e.g. puzzlegen.batch.iter_batch) and the
+    # boards never have to be held in memory all at once
     c_puzzles = canvas.Canvas(filename_puzzles, pagesize=letter)
     c_solutions = canvas.Canvas(filename_solutions, pagesize=letter)
     width, height = letter
     margin = inch
 
-    for i, (puzzle, solution) in enumerate(zip(puzzles, solutions)):
-        cages = generate_cages(solution)
-        draw_sudoku(c_puzzles, puzzle, solution, cages, width, height, margin)
-        draw_sudoku(c_solutions, solution, solution, cages, width, height, margin)
-        if i < len(puzzles) - 1:
+    count = 0
+    for puzzle, solution, cages in entries:
+        with metrics.timer('killer.draw'):
+            draw_sudoku(c_puzzles, puzzle, solution, cages, width, height, margin)
+            draw_sudoku(c_solutions, solution, solution, cages, width, height, margin)
             c_puzzles.showPage()
             c_solutions.showPage()
-    
-    c_puzzles.save()
-    c_solutions.save()
+        count += 1
+
+    with metrics.timer('killer.save'):
+        c_puzzles.save()
+        c_solutions.save()
+    return count
 
 def draw_sudoku(canvas, board, solution, cages, width, height, margin):
     cell_size = (width - 2 * margin) / 9
@@ -142,22 +314,17 @@ def draw_sudoku(canvas, board, solution, cages, width, height, margin):
         (0.5, 0.5, 0.5)  # Grey for fallback
     ]
 
-    # Draw cells and numbers
+    # The empty grid is drawn once per document and reused on every page
+    canvas.doForm(sudoku_grid_form(canvas, width, height, margin))
+
+    # Draw numbers
     for i in range(9):
         for j in range(9):
-            x = margin + j * cell_size
-            y = height - margin - (i + 1) * cell_size
-            canvas.rect(x, y, cell_size, cell_size)
             if board[i][j] != 0:
+                x = margin + j * cell_size
+                y = height - margin - (i + 1) * cell_size
                 canvas.drawString(x + cell_size / 2.5, y + cell_size / 3, str(board[i][j]))
 
-    # Draw thicker lines for the 3x3 sub-grids
-    for i in range(10):
-        line_width = 2 if i % 3 == 0 else 1
-        canvas.setLineWidth(line_width)
-        canvas.line(margin, height - margin - i * cell_size, margin + 9 * cell_size, height - margin - i * cell_size)
-        canvas.line(margin + i * cell_size, height - margin, margin + i * cell_size, height - margin - 9 * cell_size)
-
     # Draw cages around cells with the same sum constraint (for Killer Sudoku)
     for cage in cages:
         canvas.setStrokeColorRGB(0, 0, 0)  # Set color to black
@@ -180,12 +347,6 @@ def draw_sudoku(canvas, board, solution, cages, width, height, margin):
             if (r+1, c) not in cage['cells']:
                 canvas.line(x1, y1, x2, y1)  # Bottom border
 
-        # Debug: Print the calculated coordinates for the cage. 
-        # Use values in killer-sudoku-visualization.py
-        
-        print(f"{cage['id']}: {cage['cells']},")
-        print(f"{cage['id']}: {cage['sum']},")     
-        
         # Draw the sum of the cage at the top-left of the cage
         first_cell = min(cage['cells'], key=lambda cell: (cell[0], cell[1]))  # Top-left cell of the cage
         sum_x = margin + first_cell[1] * cell_size + 4
@@ -197,21 +358,16 @@ def draw_sudoku(canvas, board, solution, cages, width, height, margin):
 
     # Reset color to black for further drawing
     canvas.setStrokeColorRGB(0, 0, 0)
+    metrics.count('killer.cages_drawn', len(cages))
 
 def main():
     try:
         num_puzzles = int(input("Enter number of puzzles to generate: "))
         difficulty = input("Enter difficulty level (easy, medium, hard): ").strip().lower()
 
-        puzzles = []
-        solutions = []
-
-        for _ in range(num_puzzles):
-            puzzle, solution = generate_sudoku(difficulty)
-            puzzles.append(puzzle)
-            solutions.append(solution)
-    
-        create_pdf(puzzles, solutions, "killer_sudoku_puzzles.pdf", "killer_sudoku_solutions.pdf")
+        # Puzzles are generated on a process pool while earlier ones are drawn
+        entries = iter_batch('killer', num_puzzles, difficulty)
+        write_pdf(entries, "killer_sudoku_puzzles.pdf", "killer_sudoku_solutions.pdf")
         print(f"{num_puzzles} Sudoku puzzles generated and saved successfully!")
 
     except ValueError:
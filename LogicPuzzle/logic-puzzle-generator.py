@@ -1,14 +1,46 @@
-import json
+import os
 import random
+import sys
 from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import Paragraph, Frame
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from puzzlegen import logic_config, logic_solver, metrics
+
+# Number of names and of categories besides Names for each difficulty level
+PUZZLE_SIZES = {
+    'easy': (5, 2),
+    'medium': (5, 3),
+    'hard': (6, 4)
+}
+
+# Page layout limits, in points
+PAGE_MARGIN = 50
+MAX_CELL_SIZE = 30
+LABEL_FONT = 'Helvetica'
+MAX_LABEL_FONT_SIZE = 10
+CLUE_FONT_SIZES = (12, 11, 10, 9, 8, 7, 6)
+CLUE_COLUMN_GAP = 20
+
+# Template fields each structured clue type fills in (see puzzlegen.logic_solver)
+CLUE_FIELDS = {
+    'positive': frozenset({'name1', 'item1'}),
+    'negative': frozenset({'name1', 'item1'}),
+    'exclusive': frozenset({'item1', 'item2'})
+}
+
 def load_config(filename='config.json'):
-    with open(filename, 'r') as file:
-        return json.load(file)
+    # Compiled once and cached (see puzzlegen.logic_config); also checks that
+    # every clue type has a template with exactly the fields it fills in
+    config = logic_config.load_config(filename)
+    for clue_type, fields in CLUE_FIELDS.items():
+        if (clue_type, fields) not in config.templates:
+            raise ValueError(f"No {clue_type} clue template uses exactly {sorted(fields)}")
+    return config
 
 def read_names(filename):
     with open(filename, 'r') as file:
@@ -18,32 +50,35 @@ def read_names(filename):
 def select_names(names, num=5):
     return random.sample(names, num)
 
-def generate_categories(config, difficulty):
-    category_names = list(config['categories'].keys())
-    difficulty_levels = {
-        'easy': 2,
-        'medium': 3,
-        'hard': 3
-    }
-    num_categories = difficulty_levels.get(difficulty, 2)
-    return random.sample(category_names, num_categories)
+def generate_categories(config, num_categories):
+    if num_categories > len(config.categories):
+        raise ValueError(f"Requested {num_categories} categories but the config only has {len(config.categories)}.")
+    return random.sample(config.categories, num_categories)
 
 def generate_items(config, names, categories):
+    # One list of len(names) items per category
     num_items = len(names)
     items = []
+    used = set()
     
     for category in categories:
-        category_items = config['categories'].get(category, [])
+        category_items = config.values[config.category_index[category]]
 
         # Check if num_items_per_category is more than available items
         if num_items > len(category_items):
             raise ValueError(f"Requested number of items for category '{category}' exceeds available items.")
-        
-        # Randomly sample items from the category
-        sampled_items = random.sample(category_items, num_items)
 
-        # Add sampled items to the result dictionary
-        items.extend(sampled_items)
+        # Prefer values no other category has used (config.json has "Orange"
+        # as both a color and a fruit), so every item names one cell; if
+        # there are too few, qualify the repeats with their category
+        unused = [value for value in category_items if value not in used]
+        if num_items <= len(unused):
+            sampled_items = random.sample(unused, num_items)
+        else:
+            sampled_items = [value if value not in used else f"{value} ({category})"
+                             for value in random.sample(category_items, num_items)]
+        used.update(sampled_items)
+        items.append(sampled_items)
 
     return items
 
@@ -68,135 +103,196 @@ def get_clue_distributions(difficulty):
 
     return distributions.get(difficulty, distributions['easy'])
 
-def generate_clues(config, names, categories, difficulty):
+def clue_text(config, clue, names, items):
+    # Render a structured clue with a template that uses exactly its fields;
+    # items holds the item list of each category besides Names
+    templates = config.templates[(clue['type'], CLUE_FIELDS[clue['type']])]
+    context = {'item1': items[clue['category']][clue['item']]}
+    if clue['type'] == 'exclusive':
+        context['item2'] = items[clue['category2']][clue['item2']]
+    else:
+        context['name1'] = names[clue['name']]
+    return random.choice(templates).format(**context)
+
+def generate_clues(solution, difficulty):
+    # Structured clues that hold for solution and leave it as the only answer
     distributions = get_clue_distributions(difficulty)
-    num_clues = 10
-
-    # Determine how many clues of each type
-    num_positive = int(num_clues * distributions['positive'] / 100)
-    num_negative = int(num_clues * distributions['negative'] / 100)
-    num_exclusive = num_clues - (num_positive + num_negative)
-
-    clue_types = {
-        'positive': config['clue_templates']['positive'],
-        'negative': config['clue_templates']['negative'],
-        'exclusive': config['clue_templates']['exclusive']
+    return logic_solver.make_clues(solution, distributions)
+
+def clue_paragraphs(clues, width, height):
+    # Numbered clue paragraphs at the largest font size, in one column or
+    # two, that fits a width x height area. Returns (paragraphs, columns,
+    # height needed); frames pad their content by 6 points on each side.
+    for font_size in CLUE_FONT_SIZES:
+        style = ParagraphStyle('default', fontSize=font_size, leading=font_size + 2)
+        for columns in (1, 2):
+            column_width = (width - CLUE_COLUMN_GAP * (columns - 1)) / columns
+            paragraphs = [Paragraph(f"{i+1}. {clue}", style) for i, clue in enumerate(clues)]
+            heights = [p.wrap(column_width - 12, height)[1] for p in paragraphs]
+            # A paragraph that does not fit at the foot of one column starts the next
+            needed = sum(heights) / columns + (max(heights, default=0) if columns > 1 else 0) + 12
+            if needed <= height:
+                return paragraphs, columns, needed
+    return paragraphs, columns, needed
+
+def grid_layout(categories, items, clues, pagesize=letter):
+    # Fit the grid, its item labels and the clues on one page. The blocks
+    # form a staircase: row category r (from the last one up to 1) against
+    # column categories 0 .. r - 1, with Names as category 0. Returns the
+    # cell size, the label font size, the top-left corner of the first
+    # block and the clue area as (x, y, width, height).
+    page_width, page_height = pagesize
+    width = page_width - 2 * PAGE_MARGIN
+    height = page_height - 2 * PAGE_MARGIN
+    num_blocks = len(categories) - 1
+    n = len(items[0])
+
+    # Clues get the room they need, up to half the page
+    _, _, clue_height = clue_paragraphs(clues, width, height / 2)
+    clue_height = min(clue_height, height / 2) + 10
+    grid_height = height - clue_height
+
+    # Labels scale with the cells, so settle the cell size in two passes
+    font_size = MAX_LABEL_FONT_SIZE
+    for _ in range(2):
+        row_labels = max(stringWidth(item, LABEL_FONT, font_size) for category in items[1:] for item in category)
+        col_labels = max(stringWidth(item, LABEL_FONT, font_size) for category in items[:-1] for item in category)
+        cell_size = min(MAX_CELL_SIZE, (width - row_labels - 6) / (num_blocks * n),
+                        (grid_height - col_labels - 6) / (num_blocks * n))
+        font_size = min(MAX_LABEL_FONT_SIZE, cell_size * 0.8)
+
+    grid_width = num_blocks * n * cell_size + row_labels + 6
+    x_start = PAGE_MARGIN + (width - grid_width) / 2 + row_labels + 6
+    y_start = page_height - PAGE_MARGIN - col_labels - 6
+    clue_top = y_start - num_blocks * n * cell_size - 10
+    return {
+        'cell_size': cell_size,
+        'font_size': font_size,
+        'x_start': x_start,
+        'y_start': y_start,
+        'clue_frame': (PAGE_MARGIN, PAGE_MARGIN, width, clue_top - PAGE_MARGIN)
     }
 
-    clues = []
-
-    # Function to generate a single clue
-    def generate_single_clue(clue_type):
-        template = random.choice(clue_types[clue_type])
-        name1, name2 = random.sample(names, 2)
-        category = random.choice(categories)
-        values = config['categories'].get(category, [])
-
-        if len(values) > 1:
-            item1 = random.choice(values)
-            item2 = random.choice([v for v in values if v != item1])
-        elif values:
-            item1 = values[0]
-            item2 = "Unknown"
-        else:
-            item1 = "Unknown"
-            item2 = "Unknown"
-
-        context = {
-            'name1': name1,
-            'name2': name2,
-            'item1': item1,
-            'item2': item2,
-            'category': category
-        }
-
-        try:
-            clue = template.format(**context)
-        except KeyError as e:
-            print(f"KeyError: Missing key '{e.args[0]}' in template '{template}'")
-            clue = template
-
-        return clue
-
-    # Generate clues according to distribution
-    for _ in range(num_positive):
-        clues.append(f"{generate_single_clue('positive')}")
-    for _ in range(num_negative):
-        clues.append(f"{generate_single_clue('negative')}")
-    for _ in range(num_exclusive):
-        clues.append(f"{generate_single_clue('exclusive')}")
-
-    random.shuffle(clues)
-    return clues
-
-def draw_grid(canvas, categories, items, cell_size=30, x_start=100, y_start=650):
+def draw_grid(canvas, categories, items, layout):
     num_categories = len(categories)
-    items_per_category = 5 #len(items) // num_categories
-
-    # Calculate total grid size (for the overall grid containing all subgrids)
-    total_grid_width = items_per_category * cell_size * (num_categories - 1)
-    total_grid_height = items_per_category * cell_size * (num_categories - 1)
-
-    # Adjust the position and size to fit on the page
-    x_start = (letter[0] - total_grid_width) / 2
-    y_start = (letter[1] + total_grid_height) / 2 + 250
+    items_per_category = len(items[0])
+    cell_size = layout['cell_size']
+    x_start, y_start = layout['x_start'], layout['y_start']
+    block = items_per_category * cell_size
+
+    # Item labels: column categories along the top, rotated, and each row
+    # category down the left of its row of blocks
+    canvas.setFont(LABEL_FONT, layout['font_size'])
+    for col_category_idx in range(num_categories - 1):
+        for j, item in enumerate(items[col_category_idx]):
+            canvas.saveState()
+            canvas.translate(x_start + col_category_idx * block + (j + 0.5) * cell_size + layout['font_size'] / 3, y_start + 4)
+            canvas.rotate(90)
+            canvas.drawString(0, 0, item)
+            canvas.restoreState()
+    for row_category_idx in range(num_categories - 1, 0, -1):
+        top = y_start - (num_categories - 1 - row_category_idx) * block
+        for i, item in enumerate(items[row_category_idx]):
+            canvas.drawRightString(x_start - 4, top - (i + 0.5) * cell_size - layout['font_size'] / 3, item)
 
     # Draw subgrids
     for row_category_idx in range(num_categories - 1, 0, -1):
         for col_category_idx in range(row_category_idx):
-            subgrid_x_start = x_start + col_category_idx * items_per_category * cell_size
-            subgrid_y_start = y_start - (num_categories - row_category_idx) * items_per_category * cell_size
+            subgrid_x_start = x_start + col_category_idx * block
+            subgrid_y_start = y_start - (num_categories - 1 - row_category_idx) * block
 
             # Draw subgrid lines
-            for i in range(items_per_category + 1):
-                canvas.setLineWidth(1)
+            canvas.setLineWidth(0.5)
+            for i in range(1, items_per_category):
                 # Vertical lines within the subgrid
                 canvas.line(subgrid_x_start + i * cell_size, subgrid_y_start, 
-                       subgrid_x_start + i * cell_size, subgrid_y_start - items_per_category * cell_size)
+                       subgrid_x_start + i * cell_size, subgrid_y_start - block)
                 # Horizontal lines within the subgrid
                 canvas.line(subgrid_x_start, subgrid_y_start - i * cell_size, 
-                       subgrid_x_start + items_per_category * cell_size, subgrid_y_start - i * cell_size)
+                       subgrid_x_start + block, subgrid_y_start - i * cell_size)
     
             # Draw thicker borders for the subgrid
             canvas.setLineWidth(2)
-            canvas.rect(subgrid_x_start, subgrid_y_start - items_per_category * cell_size, 
-                   items_per_category * cell_size, items_per_category * cell_size)
+            canvas.rect(subgrid_x_start, subgrid_y_start - block, block, block)
 
-def draw_solution(canvas, categories, items, correct_answers, cell_size=30, x_start=100, y_start=650):
+def draw_solution(canvas, categories, items, correct_answers, layout):
     # Draw grid with TRUE and FALSE markers
-    draw_grid(canvas, categories, items, cell_size, x_start, y_start)
+    draw_grid(canvas, categories, items, layout)
+    num_categories = len(categories)
+    cell_size = layout['cell_size']
+    block = len(items[0]) * cell_size
 
     # Mark correct answers with circles
     canvas.setFillColorRGB(0, 0, 0) # Fill color for dots
-    for (row, col) in correct_answers: 
-        x = x_start + col * cell_size + cell_size / 2
-        y = y_start - row * cell_size + cell_size / 2
-        canvas.circle(x, y, 10, fill=True)
-
-    # # Optionally mark FALSE with X
-    # canvas.setStrokeColorRGB(1, 0, 0)  # Set color for X marks
-    # canvas.setLineWidth(1)
-    # for (row, col) in correct_answers:
-    #     x = x_start + col * cell_size
-    #     y = y_start - row * cell_size
-    #     canvas.line(x, y, x + cell_size, y - cell_size)  # Draw X
-    #     canvas.line(x + cell_size, y, x, y - cell_size)
+    for (row_category_idx, col_category_idx), rows in correct_answers.items():
+        x_block = layout['x_start'] + col_category_idx * block
+        y_block = layout['y_start'] - (num_categories - 1 - row_category_idx) * block
+        for i, row in enumerate(rows):
+            j = row.bit_length() - 1
+            x = x_block + j * cell_size + cell_size / 2
+            y = y_block - i * cell_size - cell_size / 2
+            canvas.circle(x, y, cell_size / 3, fill=True)
 
 def create_pdf(categories, items, clues, correct_answers, c_puzzles, c_solutions):
-    draw_grid(c_puzzles, categories, items)
-    draw_solution(c_solutions, categories, items, correct_answers)
-
-    # Add clues below the puzzle grid
-    style = ParagraphStyle('default', fontSize=12, leading=14)
-    numbered_clues = [Paragraph(f"{i+1}. {clue}", style) for i, clue in enumerate(clues)]
-    
-    frame = Frame(100, 100, letter[0] - 200, 150, showBoundary=0)
-    story = numbered_clues
-    frame.addFromList(story, c_puzzles)
+    layout = grid_layout(categories, items, clues)
+    draw_grid(c_puzzles, categories, items, layout)
+    draw_solution(c_solutions, categories, items, correct_answers, layout)
+
+    # Add clues below the puzzle grid, flowing from one column into the next
+    x, y, width, height = layout['clue_frame']
+    story, columns, _ = clue_paragraphs(clues, width, height)
+    column_width = (width - CLUE_COLUMN_GAP * (columns - 1)) / columns
+    for column in range(columns):
+        frame = Frame(x + column * (column_width + CLUE_COLUMN_GAP), y, column_width, height, showBoundary=0)
+        frame.addFromList(story, c_puzzles)
 
     c_puzzles.showPage()
     c_solutions.showPage()
 
+def write_pdf(puzzles, filename_puzzles, filename_solutions):
+    # One page per puzzle from generate_puzzle, drawn as they arrive so
+    # puzzles can be a generator (see puzzlegen.batch)
+    c_puzzles = canvas.Canvas(filename_puzzles, pagesize=letter)
+    c_solutions = canvas.Canvas(filename_solutions, pagesize=letter)
+
+    count = 0
+    for categories, items, clues, correct_answers in puzzles:
+        with metrics.timer('logic.draw'):
+            create_pdf(categories, items, clues, correct_answers, c_puzzles, c_solutions)
+        count += 1
+
+    with metrics.timer('logic.save'):
+        c_puzzles.save()
+        c_solutions.save()
+    return count
+
+def generate_puzzle(difficulty, config=None, names=None, num_names=None, num_categories=None,
+                    config_file='config.json', names_file='names.txt'):
+    # One unit of batch work (see puzzlegen.batch). num_names and
+    # num_categories (not counting Names) override the difficulty's size;
+    # config and names default to loading config_file and names_file.
+    if difficulty not in PUZZLE_SIZES:
+        raise ValueError("Invalid difficulty level")
+    if config is None:
+        config = load_config(config_file)
+    if names is None:
+        names = read_names(names_file)
+    default_names, default_categories = PUZZLE_SIZES[difficulty]
+
+    selected_names = select_names(names, num_names or default_names)
+    categories_without_names = generate_categories(config, num_categories or default_categories)
+    categories = ["Names"] + categories_without_names
+    category_items = generate_items(config, selected_names, categories_without_names)
+    items = [selected_names] + category_items
+
+    # Hide an assignment, then derive clues that pin it down
+    solution = logic_solver.random_solution(len(selected_names), len(categories_without_names))
+    clues = [clue_text(config, clue, selected_names, category_items)
+             for clue in generate_clues(solution, difficulty)]
+    correct_answers = logic_solver.solution_matrices(solution)
+
+    return categories, items, clues, correct_answers
+
 def main():
     config = load_config()
     names = read_names('names.txt')
@@ -208,25 +304,14 @@ def main():
     c_solutions = canvas.Canvas("logic_solutions.pdf", pagesize=letter)
 
     for _ in range(num_puzzles):
-        selected_names = select_names(names)
-        categories_without_names = generate_categories(config, difficulty)
-        categories = ["Names"] + categories_without_names
-        items = selected_names + generate_items(config, selected_names, categories_without_names)
-        clues = generate_clues(config, selected_names, categories_without_names, difficulty)
-
-        print(categories)
-        print(selected_names)
-        print(items)    
-        print(clues)
-
-        # Generate and save solution
-        correct_answers = {(0, 1), (1, 2)}  # Example correct answers; update based on actual solution
-        
+        categories, items, clues, correct_answers = generate_puzzle(difficulty, config, names)
+
         # Generate and save puzzle
         create_pdf(categories, items, clues, correct_answers, c_puzzles, c_solutions)
     
     c_puzzles.save()
     c_solutions.save()
+    print(f"{num_puzzles} logic puzzles generated and saved successfully!")
 
 if __name__ == "__main__":
     main()
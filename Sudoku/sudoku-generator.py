@@ -1,10 +1,38 @@
+import os
 import random
+import sys
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 
-def generate_sudoku(difficulty):
-    base = 3
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from puzzlegen import metrics, sudoku_grader, sudoku_solver
+from puzzlegen.batch import iter_batch
+from puzzlegen.render import sudoku_grid_form
+from puzzlegen.sudoku_board import flatten, side_of, to_rows
+
+# Score bands (see puzzlegen.sudoku_grader) for rated generation: easy needs
+# only hidden singles, medium adds naked singles and box/line interactions,
+# hard needs pairs, triples, X-wings or swordfish
+RATING_BANDS = {
+    'easy': (1.0, 1.5),
+    'medium': (2.3, 2.8),
+    'hard': (3.0, 4.0)
+}
+
+# Holes to dig per 81 cells, scaled to the board size
+HOLES = {
+    'easy': (28, 36),
+    'medium': (37, 45),
+    'hard': (46, 54)
+}
+# Search nodes a uniqueness check may spend, by base, before the clue it
+# would remove is kept instead; bases not listed have no limit
+UNIQUE_NODE_LIMITS = {4: 100, 5: 10}
+
+def generate_solution(base=3):
+    # A solved board as a flat bytearray (see puzzlegen.sudoku_board) with
+    # base x base boxes: base 2 gives 4x4, 3 gives 9x9, 4 16x16, 5 25x25
     side = base * base
 
     # Pattern for a baseline valid solution
@@ -18,108 +46,130 @@ def generate_sudoku(difficulty):
     nums = shuffle(range(1, base * base + 1))
 
     # Produce board using randomized baseline pattern
-    board = [[nums[pattern(r,c)] for c in cols] for r in rows]
-
-    # Determine number of empty squares based on difficulty
-    if difficulty == 'easy':
-        no_of_holes = random.randint(28, 36)
-    elif difficulty == 'medium':
-        no_of_holes == random.randint(37,45)
-    elif difficulty == 'hard':
-        no_of_holes == random.randint(46, 54)
-    else:
+    return bytearray(nums[pattern(r,c)] for r in rows for c in cols)
+
+def generate_sudoku(difficulty, unique=False, rated=False, base=3):
+    if rated:
+        # Dig by human-technique score rather than hole count, starting over
+        # from a fresh solution whenever the band can't be reached
+        if difficulty not in RATING_BANDS:
+            raise ValueError("Invalid difficulty level")
+        if base != 3:
+            raise ValueError("Rated generation is only available for 9x9 boards")
+        while True:
+            solution = generate_solution()
+            puzzle = sudoku_grader.dig_rated(to_rows(solution), *RATING_BANDS[difficulty])
+            if puzzle is not None:
+                return flatten(puzzle), solution
+            metrics.count('sudoku.rated_restarts')
+
+    if difficulty not in HOLES:
         raise ValueError("Invalid difficulty level")
+    board = generate_solution(base)
+    squares = len(board)
 
-    squares = side * side
+    # Determine number of empty squares based on difficulty
+    low, high = HOLES[difficulty]
+    no_of_holes = random.randint(low * squares // 81, high * squares // 81)
+
+    if unique:
+        # Remove clues one at a time, keeping a removal only while the puzzle
+        # still has exactly one solution, i.e. while the removed digit is
+        # forced by the rest. A check that runs past the base's
+        # UNIQUE_NODE_LIMITS entry keeps its clue. Stops early if no further
+        # clue can go.
+        solution = board[:]
+        node_limit = UNIQUE_NODE_LIMITS.get(base)
+        removed = rejected = limited = 0
+        for p in random.sample(range(squares), squares):
+            if removed == no_of_holes:
+                break
+            board[p] = 0
+            try:
+                forced = sudoku_solver.is_forced(board, p, solution[p], node_limit)
+            except sudoku_solver.SearchLimitExceeded:
+                forced = False
+                limited += 1
+            if forced:
+                removed += 1
+            else:
+                board[p] = solution[p]
+                rejected += 1
+        metrics.count('sudoku.rejected_holes', rejected)
+        metrics.count('sudoku.node_limit_hits', limited)
+        return board, solution
+
+    # The board the holes are dug from is one solution of the puzzle; solving
+    # the dug board again can take minutes on 25x25 boards with many holes
+    solution = board[:]
     for p in random.sample(range(squares), no_of_holes):
-        board[p // side][p % side] = 0
-    
-    return board, solve_sudoku([row[:] for row in board])
-
-def solve_sudoku(board):
-    side = len(board)
-
-    def find_empty_location(board):
-        for row in range(side):
-            for col in range(side):
-                if board[row][col] == 0:
-                    return row, col
-        return None
-    
-    def is_safe(board, row, col, num):
-        for x in range(side):
-            if board[row][x] == num or board[x][col] == num:
-                return False
-        start_row, start_col = 3 * (row // 3), 3 * (col // 3)
-        for i in range(3):
-            for j in range(3):
-                if board[i + start_row][j + start_col] == num:
-                    return False
-        return True
-    
-    def solve(board):
-        empty_loc = find_empty_location(board)
-        if not empty_loc:
-            return True
-        row, col = empty_loc
-        for num in range(1, side + 1):
-            if is_safe(board, row, col, num):
-                board[row][col] = num
-                if solve(board):
-                    return True
-                board[row][col] = 0
-        return False
+        board[p] = 0
     
-    solve(board)
+    return board, solution
+
+def solve_sudoku(board, engine='bitmask'):
+    # Fill board (flat or a list of rows) in place, leaving it unchanged if it
+    # cannot be solved. engine is one of sudoku_solver.ENGINES.
+    solution = sudoku_solver.solve(board, engine)
+    if solution is not None:
+        board[:] = solution
     return board
 
+def generate_puzzle(difficulty, unique=False, rated=False, base=3):
+    # One unit of batch work (see puzzlegen.batch): a (puzzle, solution) pair
+    return generate_sudoku(difficulty, unique, rated, base)
+
 def create_pdf(puzzles, solutions, filename_puzzles, filename_solutions):
+    write_pdf(zip(puzzles, solutions), filename_puzzles, filename_solutions)
+
+def write_pdf(pairs, filename_puzzles, filename_solutions):
+    # Draw each (puzzle, solution) pair as soon as it arrives, so pairs can be
+    # a generator (e.g. puzzlegen.batch.iter_batch) and the boards never have
+    # to be held in memory all at once
     c_puzzles = canvas.Canvas(filename_puzzles, pagesize=letter)
     c_solutions = canvas.Canvas(filename_solutions, pagesize=letter)
     width, height = letter
     margin = inch
 
-    for i, (puzzle, solution) in enumerate(zip(puzzles, solutions)):
-        draw_sudoku(c_puzzles, puzzle, width, height, margin)
-        draw_sudoku(c_solutions, solution, width, height, margin)
-        if i < len(puzzles) - 1:
+    count = 0
+    for puzzle, solution in pairs:
+        with metrics.timer('sudoku.draw'):
+            draw_sudoku(c_puzzles, puzzle, width, height, margin)
+            draw_sudoku(c_solutions, solution, width, height, margin)
             c_puzzles.showPage()
             c_solutions.showPage()
-    
-    c_puzzles.save()
-    c_solutions.save()
+        count += 1
+
+    with metrics.timer('sudoku.save'):
+        c_puzzles.save()
+        c_solutions.save()
+    return count
 
 def draw_sudoku(canvas, board, width, height, margin):
-    cell_size = (width - 2 * margin) / 9
-    for i in range(9):
-        for j in range(9):
-            x = margin + j * cell_size
-            y = height - margin - (i + 1) * cell_size
-            canvas.rect(x, y, cell_size, cell_size)
-            if board[i][j] != 0:
-                canvas.drawString(x + cell_size / 2.5, y + cell_size / 3, str(board[i][j]))
-    
-    # Draw thicker lines for the 3x3 sub-grids
-    for i in range(10):
-        line_width = 2 if i % 3 == 0 else 1
-        canvas.setLineWidth(line_width)
-        canvas.line(margin, height - margin - i * cell_size, margin + 9 * cell_size, height - margin - i * cell_size)
-        canvas.line(margin + i * cell_size, height - margin, margin + i * cell_size, height - margin - 9 * cell_size)
+    board = flatten(board)
+    side = side_of(board)
+    cell_size = (width - 2 * margin) / side
+
+    # The empty grid is drawn once per document and reused on every page
+    canvas.doForm(sudoku_grid_form(canvas, width, height, margin, side))
+
+    # Two-digit numbers on 16x16 and 25x25 boards get a smaller font
+    font_size = min(12, cell_size / 2)
+    canvas.setFont("Helvetica", font_size)
+    for p, value in enumerate(board):
+        if value != 0:
+            x = margin + (p % side + 0.5) * cell_size
+            y = height - margin - (p // side + 1) * cell_size
+            canvas.drawCentredString(x, y + (cell_size - font_size * 0.7) / 2, str(value))
 
 def main():
     try:
         num_puzzles = int(input("Enter number of puzzles to generate: "))
         difficulty = input("Enter difficulty level (easy, medium, hard): ").strip().lower()
 
-        puzzles = []
-        solutions = []
-
-        for _ in range(num_puzzles):
-            puzzle, solution = generate_sudoku(difficulty)
-            puzzles.append(puzzle)
-            solutions.append(solution)
-    
-        create_pdf(puzzles, solutions, "sudoku_puzzles.pdf", "sudoku_solutions.pdf")
+        # Puzzles are generated on a process pool while earlier ones are drawn
+        pairs = iter_batch('sudoku', num_puzzles, difficulty)
+        write_pdf(pairs, "sudoku_puzzles.pdf", "sudoku_solutions.pdf")
         print(f"{num_puzzles} Sudoku puzzles generated and saved successfully!")
 
     except ValueError:
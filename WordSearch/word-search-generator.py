@@ -1,62 +1,208 @@
+import math
+import os
+import sys
+
 import numpy as np
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 import random
 
-def read_words(filename, num_words=15):
-    with open(filename, 'r') as file:
-        words = file.read().splitlines()
-    words = [word.upper() for word in words]
-    return random.sample(words, num_words)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from puzzlegen import metrics
+from puzzlegen.wordlist import open_word_list
+from puzzlegen.wordscan import Scanner, clean_fill
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_blocked_words = {}
+
+def read_words(filename, num_words=15, min_length=1, max_length=None, letters=None):
+    # Draws from the compiled index next to the word list (built on first
+    # use), so only the sampled words are ever read
+    return open_word_list(filename).sample(num_words, min_length, max_length, letters)
+
+# Row and column step for each placement direction. H, V, D and A read
+# right, down, down-right and up-right; the R variants are the same lines
+# read backwards.
+DIRECTIONS = {
+    'H': (0, 1),
+    'V': (1, 0),
+    'D': (1, 1),
+    'A': (-1, 1),
+    'HR': (0, -1),
+    'VR': (-1, 0),
+    'DR': (-1, -1),
+    'AR': (1, -1)
+}
+
+# Placements tried (including backtracked ones) before giving up on a grid
+MAX_PLACEMENT_STEPS = 20000
+
+_window_cache = {}
+
+def placement_windows(size, length, direction):
+    # Flat grid indices of every in-bounds placement of a word of this length,
+    # one row per start cell, so grid.ravel()[windows] reads all of them at once
+    key = (size, length, direction)
+    if key not in _window_cache:
+        dr, dc = DIRECTIONS[direction]
+        steps = np.arange(length)
+        rows, cols = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+        end_rows, end_cols = rows + dr * (length - 1), cols + dc * (length - 1)
+        inside = (end_rows >= 0) & (end_rows < size) & (end_cols >= 0) & (end_cols < size)
+        starts_r, starts_c = rows[inside], cols[inside]
+        _window_cache[key] = (starts_r[:, None] + dr * steps) * size + starts_c[:, None] + dc * steps
+    return _window_cache[key]
 
-def create_word_search(words, size=15):
+def read_blocked(filename):
+    # Words of a block list (one word per line), read once per file
+    if filename not in _blocked_words:
+        with open(filename, 'r') as file:
+            words = [word.strip().upper() for word in file]
+        _blocked_words[filename] = [word for word in words if word]
+    return _blocked_words[filename]
+
+def create_word_search(words, size=15, directions=tuple(DIRECTIONS), blocked=None):
     grid = np.full((size, size), '', dtype='<U1')
-    word_positions = []  # To store the positions of words
-    
-    def can_place_word(word, row, col, direction):
-        if direction == 'H':
-            if col + len(word) > size:
-                return False
-            for i in range(len(word)):
-                if grid[row, col + i] not in ('', word[i]):
-                    return False
-        elif direction == 'V':
-            if row + len(word) > size:
-                return False
-            for i in range(len(word)):
-                if grid[row + i, col] not in ('', word[i]):
-                    return False
-        return True
-
-    def place_word(word, row, col, direction):
-        positions = []
-        if direction == 'H':
-            for i in range(len(word)):
-                grid[row, col + i] = word[i]
-                positions.append((row, col + i))
-        elif direction == 'V':
-            for i in range(len(word)):
-                grid[row + i, col] = word[i]
-                positions.append((row + i, col))
-        return positions
-
-    directions = ['H', 'V']
-    for word in words:
-        placed = False
-        while not placed:
-            direction = random.choice(directions)
-            row = random.randint(0, size - 1)
-            col = random.randint(0, size - 1)
-            if can_place_word(word, row, col, direction):
-                positions = place_word(word, row, col, direction)
-                word_positions.append((word, positions))
-                placed = True
-
-    grid[grid == ''] = random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=np.sum(grid == ''))
+    cells = grid.ravel()  # a view, so writes land in grid
+    letter_cells = {}  # letter -> flat positions currently holding it
+
+    def overlap_scores(word):
+        # Count, for each (direction, start), how many placed letters that
+        # window would share with word. Only cells already holding one of
+        # word's letters are looked at, so this stays cheap on a busy grid.
+        scores = {}
+        last = len(word) - 1
+        for direction in directions:
+            dr, dc = DIRECTIONS[direction]
+            for k, letter in enumerate(word):
+                for p in letter_cells.get(letter, ()):
+                    r, c = p // size - dr * k, p % size - dc * k
+                    if (0 <= r < size and 0 <= c < size
+                            and 0 <= r + dr * last < size and 0 <= c + dc * last < size):
+                        key = (direction, r * size + c)
+                        scores[key] = scores.get(key, 0) + 1
+        return scores
+
+    def valid_placements(word):
+        # Every window whose cells are empty or already hold the right
+        # letter, and which adds at least one new letter to the grid. Also
+        # returns the order to try them in: most shared letters last, since
+        # the untried list is popped from the end.
+        letters = np.array(list(word))
+        scores = overlap_scores(word)
+        found = []
+        shared = []
+        for direction in directions:
+            windows = placement_windows(size, len(word), direction)
+            if len(windows):
+                current = cells[windows]
+                fits = ((current == letters) | (current == '')).all(axis=1) & (current == '').any(axis=1)
+                windows = windows[fits]
+                found.append(windows)
+                shared.extend(scores.get((direction, int(start)), 0) for start in windows[:, 0])
+        options = np.concatenate(found) if found else np.empty((0, len(word)), dtype=int)
+        return options, sorted(random.sample(range(len(options)), len(options)), key=shared.__getitem__)
+
+    # Longest words first, since they have the fewest places to go. Each
+    # level of the stack keeps the not-yet-tried placements of its word, so
+    # running out of room backtracks into the previous word.
+    order = sorted(range(len(words)), key=lambda i: -len(words[i]))
+    stack = []
+    placed = []
+    steps = backtracks = 0
+    while len(placed) < len(order):
+        word = words[order[len(placed)]]
+        if len(stack) == len(placed):
+            stack.append(valid_placements(word))
+        options, untried = stack[-1]
+        steps += 1
+        if steps > MAX_PLACEMENT_STEPS:
+            metrics.count('wordsearch.failed_grids')
+            raise ValueError(f"Could not fit {len(words)} words in a {size}x{size} grid")
+        if untried:
+            window = options[untried.pop()]
+            previous = cells[window].copy()
+            placed.append((window, previous))
+            for p, letter, old in zip(window, word, previous):
+                if not old:
+                    letter_cells.setdefault(letter, set()).add(int(p))
+            cells[window] = list(word)
+        else:
+            stack.pop()
+            if not placed:
+                metrics.count('wordsearch.failed_grids')
+                raise ValueError(f"Could not fit {len(words)} words in a {size}x{size} grid")
+            backtracks += 1
+            window, previous = placed.pop()
+            for p, letter, old in zip(window, cells[window], previous):
+                if not old:
+                    letter_cells[letter].discard(int(p))
+            cells[window] = previous
+
+    metrics.count('wordsearch.placement_steps', steps)
+    metrics.count('wordsearch.backtracks', backtracks)
+    word_positions = [None] * len(words)
+    for i, (window, _) in zip(order, placed):
+        word_positions[i] = (words[i], [(int(p) // size, int(p) % size) for p in window])
+
+    # Fill the blanks, then redraw any fill letters that spell a hidden word
+    # somewhere other than where it was placed, or a word from the block
+    # list (see read_blocked); one Scanner looks for both
+    fill_cells = np.flatnonzero(cells == '')
+    letters = cells.tolist()
+    for p, letter in zip(fill_cells, random.choices(LETTERS, k=len(fill_cells))):
+        letters[p] = letter
+    scanner = Scanner(words, blocked or ())
+    allowed = {frozenset(int(p) for p in window) for window, _ in placed}
+    refills = clean_fill(letters, size, fill_cells.tolist(), scanner, allowed, LETTERS)
+    metrics.count('wordsearch.refills', refills)
+    cells[:] = letters
     return grid, word_positions
 
+# Grid size, number of words and allowed directions for each difficulty level
+DIFFICULTY_SETTINGS = {
+    'easy': (12, 10, ('H', 'V')),
+    'medium': (15, 15, ('H', 'V', 'D', 'A')),
+    'hard': (18, 20, tuple(DIRECTIONS))
+}
+
+def generate_puzzle(difficulty, words_file='words.txt', blocked_file=None):
+    # One unit of batch work (see puzzlegen.batch): grid, sorted words and positions
+    if difficulty not in DIFFICULTY_SETTINGS:
+        raise ValueError("Invalid difficulty level")
+    size, num_words, directions = DIFFICULTY_SETTINGS[difficulty]
+    words = read_words(words_file, num_words, max_length=size)
+    blocked = read_blocked(blocked_file) if blocked_file else None
+    grid, word_positions = create_word_search(words, size, directions, blocked)
+    return grid, sorted(words), word_positions
+
 def save_to_pdf(grid, words, filename, word_positions=None, include_word_list=True):
+    c = canvas.Canvas(filename, pagesize=letter)
+    draw_word_search(c, grid, words, word_positions, include_word_list)
+    c.save()
+
+def write_pdf(puzzles, filename_puzzles, filename_solutions):
+    # One page per (grid, words, word_positions) from generate_puzzle, drawn
+    # as they arrive so puzzles can be a generator (see puzzlegen.batch)
+    c_puzzles = canvas.Canvas(filename_puzzles, pagesize=letter)
+    c_solutions = canvas.Canvas(filename_solutions, pagesize=letter)
+
+    count = 0
+    for grid, words, word_positions in puzzles:
+        with metrics.timer('wordsearch.draw'):
+            draw_word_search(c_puzzles, grid, words)
+            draw_word_search(c_solutions, grid, words, word_positions, include_word_list=False)
+            c_puzzles.showPage()
+            c_solutions.showPage()
+        count += 1
+
+    with metrics.timer('wordsearch.save'):
+        c_puzzles.save()
+        c_solutions.save()
+    return count
+
+def draw_word_search(c, grid, words, word_positions=None, include_word_list=True):
     from reportlab.lib.pagesizes import letter
     doc_width, doc_height = letter
     cell_size = 26
@@ -72,7 +218,6 @@ def save_to_pdf(grid, words, filename, word_positions=None, include_word_list=Tr
     start_x = (doc_width - grid_width) / 2
     start_y = (doc_height + grid_height) / 2
     
-    c = canvas.Canvas(filename, pagesize=letter)
     c.setFont("Courier", font_size)  # Use a monospaced font
     
     # Write grid to PDF
@@ -86,17 +231,16 @@ def save_to_pdf(grid, words, filename, word_positions=None, include_word_list=Tr
         c.setLineWidth(2)
         corner_radius = 10 # Radius for rounded corners
         for word, positions in word_positions:
-            start_pos = positions[0]
-            end_pos = positions[-1]
-            start_x_pos = start_x + start_pos[1] * cell_size
-            start_y_pos = start_y - start_pos[0] * cell_size
-            end_x_pos = start_x + end_pos[1] * cell_size
-            end_y_pos = start_y - end_pos[0] * cell_size
-
-            if start_pos[0] == end_pos[0]:  # Horizontal word
-                c.roundRect(start_x_pos - 6, start_y_pos - font_size + 14, cell_size * len(word), font_size + 2, corner_radius, fill=0)
-            else:  # Vertical word
-                c.roundRect(start_x_pos - 6, end_y_pos + 14 - cell_size, cell_size, cell_size * len(word), corner_radius, fill=0)
+            # Outline along the line from the first to the last letter; the
+            # canvas is rotated so diagonals use the same rounded rectangle
+            (start_row, start_col), (end_row, end_col) = positions[0], positions[-1]
+            dx = (end_col - start_col) * cell_size
+            dy = (start_row - end_row) * cell_size
+            c.saveState()
+            c.translate(start_x + start_col * cell_size + 7, start_y - start_row * cell_size + 5)
+            c.rotate(math.degrees(math.atan2(dy, dx)))
+            c.roundRect(-cell_size / 2, -(font_size + 2) / 2, math.hypot(dx, dy) + cell_size, font_size + 2, corner_radius, fill=0)
+            c.restoreState()
 
     # Write list of words if include_word_list is True
     if include_word_list:
@@ -113,8 +257,6 @@ def save_to_pdf(grid, words, filename, word_positions=None, include_word_list=Tr
                 x += col_width
                 y = word_list_y + word_list_height
             c.drawString(x, y - (i % words_per_col) * (word_font_size + padding), word)
-    
-    c.save()
 
 def main():
     words = read_words('words.txt')
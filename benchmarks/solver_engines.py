@@ -0,0 +1,91 @@
+# Compare the bitmask and Dancing Links Sudoku engines.
+#
+# Usage: python benchmarks/solver_engines.py [repeats]
+#
+# Each grid is solved and uniqueness-checked (count_solutions with limit=2)
+# by both engines, and the best of `repeats` timings is reported. The same
+# is then done for Killer boards: cage layouts from the Killer script,
+# built from fixed seeds, with KILLER_GIVENS digits revealed.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from puzzlegen import sudoku_solver
+from puzzlegen.backends import load_backend
+
+HARD_GRIDS = {
+    'inkala-2012': "800000000003600000070090200050007000000045700000100030001000068008500010090000400",
+    'anti-backtracker': "000000010400000000020000000000050407008000300001090000300400200050100000000806000",
+    'norvig-hard1': "..53.....8......2..7..1.5..4....53...1..7...6..32...8..6.5....9..4....3......97..",
+    'norvig-hard2': "4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......",
+    'easter-monster': "1.......2.9.4...5...6...7...5.9.3.......7.......85..4.7.....6...3...9.8...2.....1",
+    'tarek-071223': ".2.4.37.........32........4.4.2...7.8...5.........1...5.....9...3.9....7..1..86..",
+}
+
+# Seeds of the Killer layouts, and how many digits each one reveals; the
+# cages alone are the hardest case
+KILLER_SEEDS = range(8)
+KILLER_GIVENS = (0, 4)
+
+
+def parse_grid(text):
+    text = text.replace('.', '0')
+    return [[int(text[r * 9 + c]) for c in range(9)] for r in range(9)]
+
+
+def killer_board(seed, givens):
+    # Cages over a random solution, plus `givens` of its digits
+    killer = load_backend('killer')
+    random.seed(f"solver-engines:{seed}")
+    solution = killer.generate_solution()
+    cages = killer.generate_cages(solution)
+    board = [[0] * 9 for _ in range(9)]
+    for p in random.sample(range(81), givens):
+        board[p // 9][p % 9] = solution[p // 9][p % 9]
+    return board, cages
+
+
+def best_time(func, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"{'grid':<18}{'engine':<9}{'solve ms':>10}{'count ms':>10}")
+    totals = {engine: 0.0 for engine in sudoku_solver.ENGINES}
+    for name, text in HARD_GRIDS.items():
+        board = parse_grid(text)
+        for engine in sudoku_solver.ENGINES:
+            solve = best_time(lambda: sudoku_solver.solve(board, engine), repeats)
+            count = best_time(lambda: sudoku_solver.count_solutions(board, 2, engine), repeats)
+            totals[engine] += solve
+            print(f"{name:<18}{engine:<9}{solve * 1000:>10.2f}{count * 1000:>10.2f}")
+    for engine, total in totals.items():
+        print(f"total solve time ({engine}): {total * 1000:.2f} ms")
+
+    print()
+    print(f"{'killer board':<18}{'engine':<9}{'solve ms':>10}{'count ms':>10}")
+    totals = {engine: 0.0 for engine in sudoku_solver.ENGINES}
+    for seed in KILLER_SEEDS:
+        for givens in KILLER_GIVENS:
+            board, cages = killer_board(seed, givens)
+            name = f"seed {seed}, {givens} given"
+            for engine in sudoku_solver.ENGINES:
+                solve = best_time(lambda: sudoku_solver.solve(board, engine, cages), repeats)
+                count = best_time(lambda: sudoku_solver.count_solutions(board, 2, engine, cages), repeats)
+                totals[engine] += count
+                print(f"{name:<18}{engine:<9}{solve * 1000:>10.2f}{count * 1000:>10.2f}")
+    for engine, total in totals.items():
+        print(f"total killer count time ({engine}): {total * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
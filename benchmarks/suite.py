@@ -0,0 +1,261 @@
+# Benchmark suite: generation, solving and rendering for every puzzle type.
+#
+# Usage: python benchmarks/suite.py [--quick] [--stage PATTERN] [--output results.json]
+#                                   [--compare baseline.json] [--threshold 0.15]
+#
+# Each stage runs one operation over a fixed-seed corpus: the inputs of
+# operation i are built after seeding `random` with "suite:<stage>:<i>", so
+# every run measures the same work. Inputs are prepared outside the timed
+# region, which starts after one untimed warm-up operation. A stage reports
+# throughput, latency percentiles and the peak memory traced (tracemalloc)
+# while running one extra operation; tracing is off during the timed runs,
+# so it does not skew them.
+#
+# --output writes the results as JSON. --compare reads an earlier run and
+# flags every stage whose median latency grew by more than --threshold
+# (15% by default), exiting with status 1 if any did.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from puzzlegen import logic_solver, models, puzzlefile, sudoku_solver
+from puzzlegen.backends import ROOT_DIR, load_backend
+from solver_engines import HARD_GRIDS, parse_grid
+
+# A fixed vocabulary for the word search stages, so they do not depend on a
+# local word list
+WORDS = (
+    'ACORN', 'ANCHOR', 'APRICOT', 'BADGER', 'BALCONY', 'BANANA', 'BEACON', 'BISCUIT', 'BLOSSOM', 'BRIDGE',
+    'BUCKET', 'CABBAGE', 'CACTUS', 'CANDLE', 'CANYON', 'CARPET', 'CASTLE', 'CHERRY', 'CIRCUS', 'COBALT',
+    'COMPASS', 'COTTAGE', 'CRATER', 'DOLPHIN', 'DRAGON', 'EAGLE', 'ECLIPSE', 'ELBOW', 'EMBER', 'FALCON',
+    'FEATHER', 'FIDDLE', 'FOREST', 'GALAXY', 'GARDEN', 'GLACIER', 'GOBLET', 'HAMMER', 'HARBOR', 'HAZEL',
+    'HELMET', 'HONEY', 'ISLAND', 'IVORY', 'JACKET', 'JIGSAW', 'JUNGLE', 'KETTLE', 'KITTEN', 'LADDER',
+    'LANTERN', 'LEMON', 'LIZARD', 'MAGNET', 'MANGO', 'MEADOW', 'MIRROR', 'MONKEY', 'NECTAR', 'NOODLE',
+    'OCEAN', 'ORCHID', 'OTTER', 'PADDLE', 'PARROT', 'PEBBLE', 'PEPPER', 'PILLOW', 'PLANET', 'PUZZLE',
+    'QUARTZ', 'RABBIT', 'RAISIN', 'RIBBON', 'ROCKET', 'SADDLE', 'SALMON', 'SCARF', 'SHADOW', 'SPIDER',
+    'SQUASH', 'STABLE', 'TABLET', 'TEAPOT', 'THUNDER', 'TIMBER', 'TOMATO', 'TUNNEL', 'VALLEY', 'VELVET',
+    'VIOLIN', 'WAFFLE', 'WALNUT', 'WIZARD', 'YOGURT', 'ZEBRA',
+)
+LOGIC_NAMES = ('Alice', 'Bruno', 'Chloe', 'Dmitri', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas',
+               'Kemal', 'Lena', 'Marco', 'Nadia', 'Oscar', 'Priya')
+RENDER_PAGES = 10
+
+
+class Stage:
+    def __init__(self, name, count, quick_count, prepare, run):
+        self.name = name
+        self.count = count
+        self.quick_count = quick_count
+        self.prepare = prepare  # i -> input, built after seeding random
+        self.run = run  # input -> anything; the timed part
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def stages(tmp_dir):
+    # Stages that write files put them in tmp_dir
+    sudoku = load_backend('sudoku')
+    killer = load_backend('killer')
+    wordsearch = load_backend('wordsearch')
+    logic = load_backend('logic')
+    logic_config = logic.load_config(os.path.join(ROOT_DIR, 'LogicPuzzle', 'config.json'))
+    hard_boards = [parse_grid(text) for text in HARD_GRIDS.values()]
+
+    def pdf_paths(name):
+        return os.path.join(tmp_dir, f"{name}_puzzles.pdf"), os.path.join(tmp_dir, f"{name}_solutions.pdf")
+
+    def blocked_words(i):
+        # A dense block list: 400 random four-letter strings
+        return [''.join(random.choice(wordsearch.LETTERS) for _ in range(4)) for _ in range(400)]
+
+    def logic_puzzle(difficulty):
+        return logic.generate_puzzle(difficulty, logic_config, list(LOGIC_NAMES))
+
+    return [
+        # Solving
+        Stage('sudoku.solve.hard', 60, 12, lambda i: hard_boards[i % len(hard_boards)],
+              lambda board: sudoku_solver.solve(board)),
+        Stage('sudoku.solve.hard.dlx', 60, 12, lambda i: hard_boards[i % len(hard_boards)],
+              lambda board: sudoku_solver.solve(board, 'dlx')),
+        Stage('sudoku.count.hard', 60, 12, lambda i: hard_boards[i % len(hard_boards)],
+              lambda board: sudoku_solver.count_solutions(board, 2)),
+        Stage('logic.count.6x4', 50, 10,
+              lambda i: logic_solver.make_clues(logic_solver.random_solution(6, 4),
+                                                logic.get_clue_distributions('hard')),
+              lambda clues: logic_solver.count_solutions(6, 4, clues)),
+
+        # Generation
+        Stage('sudoku.generate.hard', 200, 40, lambda i: None, lambda _: sudoku.generate_puzzle('hard')),
+        Stage('sudoku.generate.unique.hard', 100, 20, lambda i: None,
+              lambda _: sudoku.generate_puzzle('hard', unique=True)),
+        Stage('sudoku.generate.rated.medium', 10, 3, lambda i: None,
+              lambda _: sudoku.generate_puzzle('medium', rated=True)),
+        Stage('sudoku.generate.unique.16x16', 20, 5, lambda i: None,
+              lambda _: sudoku.generate_puzzle('hard', unique=True, base=4)),
+        Stage('sudoku.generate.unique.25x25', 3, 1, lambda i: None,
+              lambda _: sudoku.generate_puzzle('medium', unique=True, base=5)),
+        Stage('killer.generate_cages', 200, 40, lambda i: killer.generate_solution(),
+              lambda solution: killer.generate_cages(solution)),
+        Stage('killer.generate.unique', 10, 3, lambda i: None,
+              lambda _: killer.generate_puzzle('medium', givens=0)),
+        Stage('wordsearch.create.15x15.dense', 100, 20, lambda i: random.sample(WORDS, 30),
+              lambda words: wordsearch.create_word_search(words, 15)),
+        Stage('wordsearch.create.20x20.dense', 50, 10, lambda i: random.sample(WORDS, 55),
+              lambda words: wordsearch.create_word_search(words, 20)),
+        Stage('wordsearch.create.15x15.blocked', 50, 10, lambda i: (random.sample(WORDS, 25), blocked_words(i)),
+              lambda args: wordsearch.create_word_search(args[0], 15, blocked=args[1])),
+        Stage('logic.generate_clues.5x3', 100, 20, lambda i: logic_solver.random_solution(5, 3),
+              lambda solution: logic.generate_clues(solution, 'hard')),
+        Stage('logic.generate_clues.8x6', 20, 5, lambda i: logic_solver.random_solution(8, 6),
+              lambda solution: logic.generate_clues(solution, 'hard')),
+
+        # Puzzle files (see puzzlegen.puzzlefile), 100 records per operation
+        Stage('puzzlefile.dumps.sudoku', 50, 10,
+              lambda i: [models.SudokuPuzzle(*sudoku.generate_puzzle('hard')) for _ in range(100)],
+              lambda puzzles: [puzzlefile.dumps(model) for model in puzzles]),
+        Stage('puzzlefile.loads.sudoku', 50, 10,
+              lambda i: [puzzlefile.dumps(models.SudokuPuzzle(*sudoku.generate_puzzle('hard'))) for _ in range(100)],
+              lambda records: [puzzlefile.loads(record) for record in records]),
+        Stage('puzzlefile.loads.killer', 50, 10,
+              lambda i: [puzzlefile.dumps(models.from_entry('killer', killer.generate_puzzle('hard')))
+                         for _ in range(100)],
+              lambda records: [puzzlefile.loads(record) for record in records]),
+
+        # Rendering, RENDER_PAGES puzzles (and as many solutions) per document
+        Stage('render.sudoku', 10, 3, lambda i: [sudoku.generate_puzzle('hard') for _ in range(RENDER_PAGES)],
+              lambda pairs: sudoku.write_pdf(pairs, *pdf_paths('sudoku'))),
+        Stage('render.sudoku.25x25', 5, 2,
+              lambda i: [sudoku.generate_puzzle('hard', base=5) for _ in range(RENDER_PAGES)],
+              lambda pairs: sudoku.write_pdf(pairs, *pdf_paths('sudoku25'))),
+        Stage('render.killer', 10, 3, lambda i: [killer.generate_puzzle('hard') for _ in range(RENDER_PAGES)],
+              lambda entries: killer.write_pdf(entries, *pdf_paths('killer'))),
+        Stage('render.wordsearch', 10, 3,
+              lambda i: [(grid, sorted(words), positions) for words in
+                         (random.sample(WORDS, 20) for _ in range(RENDER_PAGES))
+                         for grid, positions in [wordsearch.create_word_search(words, 18)]],
+              lambda puzzles: wordsearch.write_pdf(puzzles, *pdf_paths('wordsearch'))),
+        Stage('render.logic', 10, 3, lambda i: [logic_puzzle('hard') for _ in range(RENDER_PAGES)],
+              lambda puzzles: logic.write_pdf(puzzles, *pdf_paths('logic'))),
+    ]
+
+
+def run_stage(stage, count):
+    inputs = []
+    for i in range(count + 1):
+        random.seed(f"suite:{stage.name}:{i}")
+        inputs.append(stage.prepare(i))
+
+    # An untimed warm-up, so imports and caches are not charged to the first operation
+    random.seed(f"suite:{stage.name}:warmup")
+    stage.run(inputs[0])
+
+    times = []
+    for i in range(count):
+        random.seed(f"suite:{stage.name}:run:{i}")
+        start = time.perf_counter()
+        stage.run(inputs[i])
+        times.append(time.perf_counter() - start)
+
+    # One more operation, traced, for its peak memory
+    random.seed(f"suite:{stage.name}:run:{count}")
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        stage.run(inputs[count])
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    times.sort()
+    total = sum(times)
+    return {
+        'count': count,
+        'seconds': round(total, 6),
+        'ops_per_second': round(count / total, 3) if total else None,
+        'p50_ms': round(percentile(times, 50) * 1000, 4),
+        'p90_ms': round(percentile(times, 90) * 1000, 4),
+        'p99_ms': round(percentile(times, 99) * 1000, 4),
+        'max_ms': round(times[-1] * 1000, 4),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return (stage, old p50, new p50, ratio) for every stage that regressed."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get('stages', {}).get(name)
+        if not old or not old.get('p50_ms'):
+            continue
+        ratio = result['p50_ms'] / old['p50_ms']
+        if ratio > 1 + threshold:
+            regressions.append((name, old['p50_ms'], result['p50_ms'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Puzzle generator benchmark suite")
+    parser.add_argument('--quick', action='store_true', help="run a smaller corpus per stage")
+    parser.add_argument('--stage', help="only run stages whose name matches this regular expression")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="flag regressions against an earlier --output file")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="relative p50 slowdown that counts as a regression (default: 0.15)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    print(f"{'stage':<34}{'n':>5}{'ops/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'peak KiB':>11}")
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='puzzlegen-suite-') as tmp_dir:
+        for stage in stages(tmp_dir):
+            if args.stage and not re.search(args.stage, stage.name):
+                continue
+            # The generators' own progress output is not part of the measurement
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = run_stage(stage, stage.quick_count if args.quick else stage.count)
+            results[stage.name] = result
+            print(f"{stage.name:<34}{result['count']:>5}{result['ops_per_second']:>10.1f}{result['p50_ms']:>10.2f}"
+                  f"{result['p90_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['max_ms']:>10.2f}{result['peak_kib']:>11.1f}")
+            sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'quick': args.quick,
+                'stages': results,
+            }, file, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, ratio in regressions:
+            print(f"REGRESSION {name}: p50 {old:.2f} ms -> {new:.2f} ms ({(ratio - 1) * 100:+.0f}%)")
+        if regressions:
+            return 1
+        print(f"No stage slowed down by more than {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# Shared engines used by the puzzle generator scripts.
+#
+# The generators live in hyphenated scripts (Sudoku/sudoku-generator.py and
+# friends) that cannot be imported directly, so anything more than one of
+# them needs is kept in this package. Each script puts the repository root
+# on sys.path before importing from here.
@@ -0,0 +1,5 @@
+import sys
+
+from puzzlegen.cli import main
+
+sys.exit(main())
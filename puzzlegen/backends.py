@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import sys
+import threading
+
+# The generator scripts, keyed by puzzle kind. They have hyphenated file
+# names, so they are loaded by path rather than imported by name.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = {
+    'sudoku': os.path.join('Sudoku', 'sudoku-generator.py'),
+    'killer': os.path.join('KillerSudoku', 'killer-sudoku-generator.py'),
+    'wordsearch': os.path.join('WordSearch', 'word-search-generator.py'),
+    'logic': os.path.join('LogicPuzzle', 'logic-puzzle-generator.py'),
+}
+
+# Held while a script runs its module code, so threads sharing one process
+# (the jobs of puzzlegen.cli) never see a half-initialized backend
+_load_lock = threading.RLock()
+
+
+def load_backend(kind):
+    """Return the generator script module for a puzzle kind."""
+    if kind not in SCRIPTS:
+        raise ValueError(f"Unknown puzzle kind '{kind}', expected one of {sorted(SCRIPTS)}")
+
+    module_name = f"puzzlegen_backend_{kind}"
+    with _load_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT_DIR, SCRIPTS[kind]))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return module
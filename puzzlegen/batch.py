@@ -0,0 +1,117 @@
+import math
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from puzzlegen import metrics
+from puzzlegen.backends import load_backend
+
+# Batch generation across a process pool.
+#
+# Puzzle i of a batch is always generated from its own seed, derived from
+# the batch seed and i, so the output only depends on (kind, n, difficulty,
+# seed, options) and never on how many workers ran or how the work was
+# chunked. The generator scripts draw from the module-level `random`, so each
+# puzzle simply reseeds it before calling the backend's generate_puzzle.
+#
+# iter_batch() yields puzzles as soon as their chunk is done and only keeps a
+# couple of chunks per worker in flight, so a consumer (such as a PDF
+# writer) can work on early puzzles while later ones are still generating,
+# and memory does not grow with the size of the batch.
+#
+# With puzzlegen.metrics enabled, workers run _measured_chunk instead, which
+# sends the chunk's counters and timers back to be merged into this process.
+
+MAX_CHUNK_SIZE = 100
+
+
+def puzzle_seed(seed, index):
+    # String seeds are hashed with SHA-512, so they are stable across
+    # processes and runs regardless of PYTHONHASHSEED
+    return f"{seed}:{index}"
+
+
+def _generate_chunk(kind, difficulty, seed, start, stop, options):
+    generate_puzzle = load_backend(kind).generate_puzzle
+    saved_state = random.getstate()
+    try:
+        results = []
+        for index in range(start, stop):
+            random.seed(puzzle_seed(seed, index))
+            with metrics.timer(f"{kind}.generate"):
+                results.append(generate_puzzle(difficulty, **options))
+        return results
+    finally:
+        random.setstate(saved_state)
+
+
+def _measured_chunk(kind, difficulty, seed, start, stop, options):
+    # Runs in a worker process, which counts this chunk alone
+    metrics.enable()
+    metrics.reset()
+    results = _generate_chunk(kind, difficulty, seed, start, stop, options)
+    return results, metrics.snapshot()
+
+
+def _chunk_ranges(n, workers, chunk_size):
+    if chunk_size is None:
+        # A few chunks per worker keeps the pool busy when chunks finish
+        # unevenly; the cap bounds how many finished puzzles sit in memory
+        chunk_size = max(1, min(math.ceil(n / (workers * 4)), MAX_CHUNK_SIZE))
+    return [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+
+
+def iter_batch(kind, n, difficulty, workers=None, seed=None, chunk_size=None, pool=None, **options):
+    """Yield n puzzles of one kind, in order, using up to `workers` processes.
+
+    kind is one of puzzlegen.backends.SCRIPTS; options are passed through to
+    that script's generate_puzzle. With workers=1 everything runs in-process.
+    pool may be a ProcessPoolExecutor shared between several batches (see
+    puzzlegen.cli); workers then only sets how many chunks are kept in flight.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    workers = workers or os.cpu_count() or 1
+    ranges = _chunk_ranges(n, workers, chunk_size)
+
+    if workers == 1 or len(ranges) <= 1:
+        for index in range(n):
+            yield from _generate_chunk(kind, difficulty, seed, index, index + 1, options)
+        return
+
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from _iter_chunks(pool, kind, difficulty, seed, ranges, workers, options)
+    else:
+        yield from _iter_chunks(pool, kind, difficulty, seed, ranges, workers, options)
+
+
+def _iter_chunks(pool, kind, difficulty, seed, ranges, workers, options):
+    measured = metrics.enabled
+    generate_chunk = _measured_chunk if measured else _generate_chunk
+    pending = deque()
+    ranges = iter(ranges)
+    for start, stop in ranges:
+        pending.append(pool.submit(generate_chunk, kind, difficulty, seed, start, stop, options))
+        if len(pending) == workers * 2:
+            break
+    try:
+        while pending:
+            chunk = pending.popleft().result()
+            if measured:
+                chunk, snap = chunk
+                metrics.merge(snap)
+            for start, stop in ranges:
+                pending.append(pool.submit(generate_chunk, kind, difficulty, seed, start, stop, options))
+                break
+            yield from chunk
+    finally:
+        # A failed or abandoned batch should not keep a shared pool busy
+        for future in pending:
+            future.cancel()
+
+
+def generate_batch(kind, n, difficulty, workers=None, seed=None, chunk_size=None, **options):
+    """Generate n puzzles of one kind and return them as a list (see iter_batch)."""
+    return list(iter_batch(kind, n, difficulty, workers, seed, chunk_size, **options))
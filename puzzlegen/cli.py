@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from puzzlegen import metrics, service
+from puzzlegen.backends import SCRIPTS, load_backend
+from puzzlegen.batch import iter_batch
+from puzzlegen.models import from_entry
+from puzzlegen.puzzlefile import read_puzzles, write_puzzles
+from puzzlegen.sudoku_store import PuzzleStore
+
+# Non-interactive entry point: python -m puzzlegen run manifest.json
+#
+# A manifest is a JSON (or, with PyYAML installed, YAML) file such as
+#
+#   {
+#     "workers": 4,
+#     "jobs": [
+#       {"type": "sudoku", "count": 200, "difficulty": "hard", "seed": 1,
+#        "output": "out/sudoku_hard", "options": {"unique": true}},
+#       {"type": "wordsearch", "count": 50, "difficulty": "easy",
+#        "output": "out/words_easy", "options": {"words_file": "words.txt"}}
+#     ]
+#   }
+#
+# or just the list of jobs. Each job writes {output}_puzzles.pdf and
+# {output}_solutions.pdf through its script's write_pdf; options go to the
+# script's generate_puzzle. A job with "format": "puzzles" writes the
+# puzzles to {output}.pzg instead (see puzzlegen.puzzlefile), to be drawn
+# later, possibly elsewhere and several files at once, with
+#
+#   python -m puzzlegen render out/sudoku_hard.pzg out/words_easy.pzg
+#
+# Jobs run side by side in threads that consume batches generated on one
+# shared process pool, so a small job is not stuck behind a large one. Jobs
+# without a seed get a random one, which is reported so the run can be
+# repeated.
+#
+# A Sudoku job may also name a "store" (see puzzlegen.sudoku_store): it is
+# then served from that store's unserved stock first, and whatever is still
+# missing is generated, checked against the store and recorded there. Both
+# are held as reserved until the job's output is written, then marked served,
+# so no run ever repeats a puzzle another run shipped; a job that fails puts
+# them back in stock. Stock is laid
+# in ahead of time with
+#
+#   python -m puzzlegen stock puzzles.db --difficulty hard --count 1000
+#
+# run --metrics prints the run's counters and stage timers (see
+# puzzlegen.metrics) and adds them to the --report file; run --profile
+# writes a cProfile dump of this process, which with --workers 1 covers
+# generation as well as drawing.
+
+JOB_KEYS = {'name', 'type', 'count', 'difficulty', 'seed', 'output', 'options', 'store', 'format'}
+FORMATS = ('pdf', 'puzzles')
+STOCK_COMMIT_SIZE = 500
+
+
+def load_manifest(path):
+    """Read and validate a manifest, returning (jobs, workers or None)."""
+    with open(path, 'r') as file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Reading YAML manifests needs PyYAML (pip install pyyaml)") from None
+            manifest = yaml.safe_load(file)
+        else:
+            manifest = json.load(file)
+
+    workers = None
+    if isinstance(manifest, dict):
+        workers = manifest.get('workers')
+        manifest = manifest.get('jobs')
+    if not isinstance(manifest, list) or not manifest:
+        raise ValueError("Manifest needs a non-empty list of jobs")
+    if workers is not None and (not isinstance(workers, int) or isinstance(workers, bool) or workers < 1):
+        raise ValueError("'workers' must be a positive integer")
+
+    jobs = []
+    for index, job in enumerate(manifest):
+        if not isinstance(job, dict):
+            raise ValueError(f"Job {index} is not an object")
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            raise ValueError(f"Job {index} has unknown keys {sorted(unknown)}")
+        if job.get('type') not in SCRIPTS:
+            raise ValueError(f"Job {index} needs a type, one of {sorted(SCRIPTS)}")
+        count = job.get('count')
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise ValueError(f"Job {index} needs a positive integer count")
+        for key in ('difficulty', 'output'):
+            if not isinstance(job.get(key), str):
+                raise ValueError(f"Job {index} needs a '{key}' string")
+        if not isinstance(job.get('options', {}), dict):
+            raise ValueError(f"Job {index} options must be an object")
+        if job.get('store') is not None and (job['type'] != 'sudoku' or not isinstance(job['store'], str)):
+            raise ValueError(f"Job {index} can only use a store (a file name) for sudoku puzzles")
+        if job.get('format', 'pdf') not in FORMATS:
+            raise ValueError(f"Job {index} format must be one of {FORMATS}")
+        jobs.append({
+            'name': str(job.get('name', f"{job['type']}-{index}")),
+            'type': job['type'],
+            'count': count,
+            'difficulty': job['difficulty'],
+            'seed': job['seed'] if job.get('seed') is not None else random.getrandbits(64),
+            'output': job['output'],
+            'options': job.get('options', {}),
+            'store': job.get('store'),
+            'format': job.get('format', 'pdf'),
+        })
+    return jobs, workers
+
+
+def _stocked_batch(job, workers, pool, result, store, reserved):
+    # The job's puzzles from its store's stock, then freshly generated ones
+    # that the store has not seen, each reserved and its id added to reserved
+    taken = store.reserve(job['difficulty'], job['count'], job['options'])
+    result['from_stock'] = len(taken)
+    for row_id, pair in taken:
+        reserved.append(row_id)
+        yield pair
+
+    needed = job['count'] - len(taken)
+    attempt = 0
+    while needed:
+        # Duplicates are replaced by another round with a derived seed;
+        # the first round uses the job's own, as a storeless run would
+        seed = job['seed'] if attempt == 0 else f"{job['seed']}/{attempt}"
+        fresh = 0
+        for puzzle, solution in iter_batch(job['type'], needed, job['difficulty'], workers=workers,
+                                           seed=seed, pool=pool, **job['options']):
+            row_id = store.add_reserved(puzzle, solution, job['difficulty'], job['options'])
+            if row_id is not None:
+                reserved.append(row_id)
+                fresh += 1
+                yield puzzle, solution
+        if not fresh:
+            raise ValueError(f"Ran out of new puzzles with {job['count'] - needed} of {job['count']} found")
+        needed -= fresh
+        attempt += 1
+
+
+def run_job(job, workers, pool=None):
+    """Generate and write one job, returning its report entry."""
+    result = {'name': job['name'], 'type': job['type'], 'difficulty': job['difficulty'],
+              'count': job['count'], 'seed': job['seed']}
+    if job['format'] == 'puzzles':
+        result['puzzles'] = f"{job['output']}.pzg"
+    else:
+        result['puzzles'] = puzzles_path = f"{job['output']}_puzzles.pdf"
+        result['solutions'] = solutions_path = f"{job['output']}_solutions.pdf"
+    start = time.perf_counter()
+    store, reserved = None, []
+    try:
+        backend = load_backend(job['type'])
+        os.makedirs(os.path.dirname(job['output']) or '.', exist_ok=True)
+        if job['store']:
+            store = PuzzleStore(job['store'])
+            puzzles = _stocked_batch(job, workers, pool, result, store, reserved)
+        else:
+            puzzles = iter_batch(job['type'], job['count'], job['difficulty'], workers=workers,
+                                 seed=job['seed'], pool=pool, **job['options'])
+        if job['format'] == 'puzzles':
+            result['written'] = write_puzzles(result['puzzles'], (from_entry(job['type'], entry) for entry in puzzles))
+        else:
+            result['written'] = backend.write_pdf(puzzles, puzzles_path, solutions_path)
+        if store is not None:
+            store.settle(reserved, served=True)
+        result['exit_code'] = 0
+    except Exception as e:
+        result['exit_code'] = 1
+        result['error'] = f"{type(e).__name__}: {e}"
+        if store is not None:
+            # Nothing was shipped, so the job's puzzles go back in stock
+            store.settle(reserved, served=False)
+    finally:
+        if store is not None:
+            store.close()
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _print_result(result):
+    if result['exit_code'] == 0:
+        stocked = f", {result['from_stock']} from stock" if 'from_stock' in result else ""
+        print(f"ok    {result['name']}: {result['written']} {result['difficulty']} {result['type']} "
+              f"(seed {result['seed']}{stocked}) in {result['seconds']:.2f}s -> {result['puzzles']}")
+    else:
+        print(f"FAIL  {result['name']}: {result['error']} after {result['seconds']:.2f}s", file=sys.stderr)
+    sys.stdout.flush()
+
+
+def run_manifest(jobs, workers):
+    """Run jobs on `workers` processes, returning their results in manifest order."""
+    if workers == 1:
+        results = []
+        for job in jobs:
+            results.append(run_job(job, 1))
+            _print_result(results[-1])
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=min(len(jobs), workers)) as threads:
+        # Fork the workers now, while this is the only thread: a worker forked
+        # while a job thread held a lock (an import, load_backend) would wait
+        # on it forever
+        pool.submit(int).result()
+        futures = {threads.submit(run_job, job, workers, pool): i for i, job in enumerate(jobs)}
+        results = [None] * len(jobs)
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            _print_result(results[futures[future]])
+    return results
+
+
+def fill_stock(path, difficulty, count, options, workers, seed):
+    """Generate count Sudoku puzzles into a store, returning (added, stock level)."""
+    with PuzzleStore(path) as store:
+        added = 0
+        pairs = []
+        for pair in iter_batch('sudoku', count, difficulty, workers=workers, seed=seed, **options):
+            pairs.append(pair)
+            if len(pairs) == STOCK_COMMIT_SIZE:
+                added += store.add_many(pairs, difficulty, options)
+                pairs = []
+        added += store.add_many(pairs, difficulty, options)
+        return added, store.stock(difficulty, options)
+
+
+def render_file(path):
+    """Draw a puzzle file of one kind to PDFs next to it, returning its report entry."""
+    stem = os.path.splitext(path)[0]
+    result = {'name': path, 'puzzles': f"{stem}_puzzles.pdf", 'solutions': f"{stem}_solutions.pdf"}
+    start = time.perf_counter()
+    try:
+        models = read_puzzles(path)
+        first = next(models, None)
+        if first is None:
+            raise ValueError("File holds no puzzles")
+        result['type'] = first.kind
+
+        def entries():
+            yield first.entry()
+            for model in models:
+                if model.kind != first.kind:
+                    raise ValueError(f"File mixes {first.kind} and {model.kind} puzzles")
+                yield model.entry()
+
+        result['written'] = load_backend(first.kind).write_pdf(entries(), result['puzzles'], result['solutions'])
+        result['exit_code'] = 0
+    except Exception as e:
+        result['exit_code'] = 1
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def render_files(paths, workers):
+    """Render puzzle files side by side on `workers` processes, printing each result."""
+    if workers == 1 or len(paths) == 1:
+        results = []
+        for path in paths:
+            results.append(render_file(path))
+            _print_rendered(results[-1])
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = {pool.submit(render_file, path): i for i, path in enumerate(paths)}
+        results = [None] * len(paths)
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            _print_rendered(results[futures[future]])
+    return results
+
+
+def _print_rendered(result):
+    if result['exit_code'] == 0:
+        print(f"ok    {result['name']}: {result['written']} {result['type']} "
+              f"in {result['seconds']:.2f}s -> {result['puzzles']}")
+    else:
+        print(f"FAIL  {result['name']}: {result['error']} after {result['seconds']:.2f}s", file=sys.stderr)
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m puzzlegen', description="Puzzle generator batch runner")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run the jobs in a JSON or YAML manifest")
+    run.add_argument('manifest')
+    run.add_argument('--workers', type=int, help="worker processes (default: the manifest's, else one per CPU)")
+    run.add_argument('--report', help="also write the job results as JSON to this file")
+    run.add_argument('--metrics', action='store_true', help="count search nodes, retries and stage times")
+    run.add_argument('--profile', metavar='PATH', help="write cProfile data to PATH (and a summary to PATH.txt)")
+    stock = commands.add_parser('stock', help="generate Sudoku puzzles into a store for later runs")
+    stock.add_argument('store')
+    stock.add_argument('--difficulty', required=True)
+    stock.add_argument('--count', type=int, required=True)
+    stock.add_argument('--options', type=json.loads, default={},
+                       help='generate_puzzle options as JSON, e.g. \'{"unique": true, "base": 4}\'')
+    stock.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    stock.add_argument('--seed', help="batch seed (default: random)")
+    render = commands.add_parser('render', help="draw puzzle files from format \"puzzles\" jobs as PDFs")
+    render.add_argument('files', nargs='+')
+    render.add_argument('--workers', type=int, help="files drawn at once (default: one per CPU)")
+    serve = commands.add_parser('serve', help="keep pools of ready puzzles and hand them out over HTTP")
+    serve.add_argument('--pool', action='append', required=True, metavar='TYPE:DIFFICULTY[:OPTIONS]',
+                       help='a pool to keep filled, e.g. sudoku:hard or \'killer:hard:{"givens": 0}\'; repeatable')
+    serve.add_argument('--low', type=int, default=service.DEFAULT_LOW, help="refill a pool once it drops below this")
+    serve.add_argument('--high', type=int, default=service.DEFAULT_HIGH, help="and top it up to this")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--socket', help="listen on this Unix socket instead of TCP")
+    serve.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            specs = [service.parse_pool(spec) for spec in args.pool]
+            asyncio.run(service.serve(specs, args.host, args.port, args.socket, args.workers, args.low, args.high))
+        except ValueError as e:
+            parser.error(str(e))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.command == 'render':
+        results = render_files(args.files, args.workers or os.cpu_count() or 1)
+        return 1 if any(result['exit_code'] for result in results) else 0
+
+    if args.command == 'stock':
+        if not isinstance(args.options, dict):
+            parser.error("--options must be a JSON object")
+        seed = args.seed if args.seed is not None else random.getrandbits(64)
+        start = time.perf_counter()
+        try:
+            added, level = fill_stock(args.store, args.difficulty, args.count, args.options, args.workers, seed)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"{args.store}: {e}", file=sys.stderr)
+            return 1
+        print(f"{added} of {args.count} {args.difficulty} puzzles added ({args.count - added} duplicates, "
+              f"seed {seed}) in {time.perf_counter() - start:.2f}s; {level} in stock")
+        return 0
+
+    try:
+        jobs, manifest_workers = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"{args.manifest}: {e}", file=sys.stderr)
+        return 2
+    workers = args.workers or manifest_workers or os.cpu_count() or 1
+
+    if args.metrics:
+        metrics.enable()
+    start = time.perf_counter()
+    with metrics.profile(args.profile) if args.profile else contextlib.nullcontext():
+        results = run_manifest(jobs, workers)
+    failed = sum(1 for result in results if result['exit_code'])
+    seconds = round(time.perf_counter() - start, 3)
+    print(f"{len(results)} jobs, {failed} failed, {seconds:.2f}s on {workers} workers")
+    if args.metrics:
+        print(metrics.report())
+
+    exit_code = 1 if failed else 0
+    if args.report:
+        report = {'exit_code': exit_code, 'seconds': seconds, 'workers': workers, 'jobs': results}
+        if args.metrics:
+            report['metrics'] = metrics.snapshot()
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=2)
+    return exit_code
@@ -0,0 +1,302 @@
+# Dancing Links (Knuth's Algorithm X) exact-cover solver.
+#
+# The matrix is stored as parallel integer lists (left, right, up, down,
+# column) rather than node objects, so covering a column is a handful of list
+# writes. Node 0 is the root; nodes 1..n are the column headers. Primary
+# columns must be covered exactly once. Secondary columns are left out of the
+# header ring, so they may stay uncovered, but still stop two chosen rows
+# from sharing them.
+
+
+class DancingLinks:
+    def __init__(self, num_primary, num_secondary=0):
+        num_columns = num_primary + num_secondary
+        self.left = [0] * (num_columns + 1)
+        self.right = [0] * (num_columns + 1)
+        self.up = list(range(num_columns + 1))
+        self.down = list(range(num_columns + 1))
+        self.column = list(range(num_columns + 1))
+        self.size = [0] * (num_columns + 1)
+        self.row_id = [None] * (num_columns + 1)
+
+        # Link the primary headers into a ring with the root
+        for c in range(num_primary + 1):
+            self.left[c] = c - 1 if c else num_primary
+            self.right[c] = c + 1 if c < num_primary else 0
+        for c in range(num_primary + 1, num_columns + 1):
+            self.left[c] = self.right[c] = c
+
+    def add_row(self, columns, row_id):
+        # columns are 0-based; primary columns come before secondary ones
+        first = None
+        for col in columns:
+            c = col + 1
+            node = len(self.column)
+            self.column.append(c)
+            self.row_id.append(row_id)
+            self.up.append(self.up[c])
+            self.down.append(c)
+            self.down[self.up[c]] = node
+            self.up[c] = node
+            self.size[c] += 1
+            if first is None:
+                first = node
+                self.left.append(node)
+                self.right.append(node)
+            else:
+                self.left.append(self.left[first])
+                self.right.append(first)
+                self.right[self.left[first]] = node
+                self.left[first] = node
+
+    def _cover(self, c):
+        left, right, up, down, column, size = (
+            self.left, self.right, self.up, self.down, self.column, self.size)
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def _uncover(self, c):
+        left, right, up, down, column, size = (
+            self.left, self.right, self.up, self.down, self.column, self.size)
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def hide_row(self, node):
+        """Unlink the row holding node from all its columns."""
+        right, up, down, column, size = self.right, self.up, self.down, self.column, self.size
+        j = node
+        while True:
+            down[up[j]] = down[j]
+            up[down[j]] = up[j]
+            size[column[j]] -= 1
+            j = right[j]
+            if j == node:
+                break
+
+    def restore_row(self, node):
+        """Relink a row taken out by hide_row(node); undo in reverse order."""
+        left, up, down, column, size = self.left, self.up, self.down, self.column, self.size
+        j = node
+        while True:
+            j = left[j]
+            size[column[j]] += 1
+            down[up[j]] = j
+            up[down[j]] = j
+            if j == node:
+                break
+
+    def search(self, limit=1, push=None, pop=None):
+        """Return up to limit exact covers, each a list of row ids.
+
+        push(row_id) is called once a row is chosen and its columns are
+        covered, so only the rows still compatible with it remain linked. It
+        may veto the row by returning False, which lets callers layer
+        constraints that are not exact cover (such as cage sums) on top;
+        pop(row_id) is called when an accepted row is backed out.
+        """
+        solutions = []
+        chosen = []
+        right, down, column, size, row_id = (
+            self.right, self.down, self.column, self.size, self.row_id)
+
+        def recurse():
+            if right[0] == 0:
+                solutions.append(chosen[:])
+                return
+
+            # Branch on the primary column with the fewest rows left
+            c, best = right[0], size[right[0]]
+            j = right[c]
+            while j != 0 and best > 1:
+                if size[j] < best:
+                    c, best = j, size[j]
+                j = right[j]
+            if best == 0:
+                return
+
+            self._cover(c)
+            r = down[c]
+            while r != c:
+                rid = row_id[r]
+                chosen.append(rid)
+                j = right[r]
+                while j != r:
+                    self._cover(column[j])
+                    j = right[j]
+                if push is None or push(rid):
+                    recurse()
+                    if pop is not None:
+                        pop(rid)
+                j = self.left[r]
+                while j != r:
+                    self._uncover(column[j])
+                    j = self.left[j]
+                chosen.pop()
+                if len(solutions) >= limit:
+                    break
+                r = down[r]
+            self._uncover(c)
+
+        recurse()
+        return solutions
+
+
+def sudoku_solutions(board, limit=1, cages=None):
+    """Return up to limit solved copies of board via exact cover.
+
+    Each (row, col, digit) choice covers one cell, row-digit, column-digit
+    and box-digit constraint (4 * 81 = 324 columns on a 9x9 board). Killer
+    cages add a secondary (cage, digit) column per digit so no digit repeats
+    inside a cage. Cage cells only get rows for digits some combination of
+    the cage's size and sum uses. Each placement narrows the cages around
+    it the same way: rows for digits no combination of what is left of the
+    cage still uses are unlinked, so column sizes steer the search as the
+    bitmask engine's candidate counts do, and the placement is vetoed when
+    a cage is left with no way to finish.
+    """
+    side = len(board)
+    base = int(round(side ** 0.5))
+    squares = side * side
+    digits = range(1, side + 1)
+
+    cage_of = {}
+    cage_digits = {}
+    if cages:
+        # Imported here because killer_solver builds on sudoku_solver, which imports this module
+        from puzzlegen.killer_solver import combination_table
+        table = combination_table(side)
+        for index, cage in enumerate(cages):
+            allowed = 0
+            for combo in table.get((len(cage['cells']), cage['sum']), ()):
+                allowed |= combo
+            for cell in cage['cells']:
+                cage_of[cell[0] * side + cell[1]] = index
+                cage_digits[cell[0] * side + cell[1]] = allowed
+
+    num_secondary = len(cages) * side if cages else 0
+    matrix = DancingLinks(4 * squares, num_secondary)
+    for r in range(side):
+        for c in range(side):
+            given = board[r][c]
+            box = (r // base) * base + c // base
+            cell = r * side + c
+            allowed = cage_digits.get(cell, ~0)
+            for d in ([given] if given else [v for v in digits if allowed >> (v - 1) & 1]):
+                columns = [r * side + c,
+                           squares + r * side + d - 1,
+                           2 * squares + c * side + d - 1,
+                           3 * squares + box * side + d - 1]
+                if cell in cage_of:
+                    columns.append(4 * squares + cage_of[cell] * side + d - 1)
+                matrix.add_row(columns, (cell, d))
+
+    push = pop = None
+    if cages:
+        cage_cells = [[r * side + c for r, c in cage['cells']] for cage in cages]
+        cage_sums = [cage['sum'] for cage in cages]
+        cage_open = [len(cells) for cells in cage_cells]
+        cage_used = [0] * len(cages)
+        cage_total = [0] * len(cages)
+        filled = bytearray(squares)
+        down, size, row_id = matrix.down, matrix.size, matrix.row_id
+
+        # Placing a digit removes rows from its own cell and from its row,
+        # column and box peers, so those are the cages it can starve
+        nearby = []
+        for cell in range(squares):
+            r, c = divmod(cell, side)
+            box = (r // base) * base + c // base
+            near = {cage_of[other] for other in range(squares) if other in cage_of and (
+                other // side == r or other % side == c
+                or (other // side // base) * base + other % side // base == box)}
+            nearby.append(near)
+
+        hidden = []
+
+        def narrow(index, hide):
+            # The cage's open cells must make up the rest of its sum with
+            # digits it does not hold yet. Unlinks the rows of open cells for
+            # digits no such combination uses, and reports whether every open
+            # cell keeps a row and the digits every such combination uses
+            # are still reachable.
+            remaining = cage_sums[index] - cage_total[index]
+            if not cage_open[index]:
+                return remaining == 0
+            used = cage_used[index]
+            allowed, required = 0, ~0
+            for combo in table.get((cage_open[index], remaining), ()):
+                if not combo & used:
+                    allowed |= combo
+                    required &= combo
+            if not allowed:
+                return False
+            reach = 0
+            for cell in cage_cells[index]:
+                if filled[cell]:
+                    continue
+                # Hidden rows keep their own links, so the walk carries on
+                i = down[cell + 1]
+                while i != cell + 1:
+                    bit = 1 << (row_id[i][1] - 1)
+                    if bit & allowed:
+                        reach |= bit
+                    else:
+                        matrix.hide_row(i)
+                        hide.append(i)
+                    i = down[i]
+                if not size[cell + 1]:
+                    return False
+            return not required & ~reach
+
+        def place(cell, d, sign):
+            index = cage_of.get(cell)
+            if index is not None:
+                filled[cell] = sign > 0
+                cage_total[index] += sign * d
+                cage_open[index] -= sign
+                cage_used[index] ^= 1 << (d - 1)
+
+        def unhide(hide):
+            for i in reversed(hide):
+                matrix.restore_row(i)
+
+        def push(row):
+            cell, d = row
+            place(cell, d, 1)
+            hide = []
+            if all(narrow(index, hide) for index in nearby[cell]):
+                hidden.append(hide)
+                return True
+            unhide(hide)
+            place(cell, d, -1)
+            return False
+
+        def pop(row):
+            unhide(hidden.pop())
+            place(*row, -1)
+
+    solutions = []
+    for rows in matrix.search(limit, push, pop):
+        solved = [[0] * side for _ in range(side)]
+        for cell, d in rows:
+            solved[cell // side][cell % side] = d
+        solutions.append(solved)
+    return solutions
@@ -0,0 +1,252 @@
+from functools import reduce
+from itertools import combinations
+from operator import or_
+
+from puzzlegen.sudoku_solver import SearchLimitExceeded, new_budget, record_nodes, unit_tables
+
+# Killer Sudoku solver built on the same bitmask propagation as
+# sudoku_solver, with every cell's candidates also intersected with what its
+# cage can still hold.
+#
+# CAGE_COMBINATIONS maps (cage size, sum) to the sets of distinct digits that
+# fill such a cage, and CAGE_MASKS to the union of those digits as a
+# bitmask. During the search a cage with k open cells and r left to make up
+# may use any combination for (k, r) that avoids the digits it already
+# holds; digits present in every such combination must go somewhere in the
+# cage, which gives cage hidden singles as well.
+
+_combination_tables = {}
+
+
+def combination_table(side=9):
+    """Return {(size, sum): [digit mask, ...]} for cages on a side x side board."""
+    if side not in _combination_tables:
+        table = {}
+        for size in range(1, side + 1):
+            for digits in combinations(range(1, side + 1), size):
+                mask = 0
+                for d in digits:
+                    mask |= 1 << (d - 1)
+                table.setdefault((size, sum(digits)), []).append(mask)
+        _combination_tables[side] = table
+    return _combination_tables[side]
+
+
+def _digits(mask):
+    return tuple(d + 1 for d in range(mask.bit_length()) if mask >> d & 1)
+
+
+CAGE_COMBINATIONS = {key: [_digits(mask) for mask in masks] for key, masks in combination_table(9).items()}
+CAGE_MASKS = {key: reduce(or_, masks) for key, masks in combination_table(9).items()}
+
+
+def _load(board, cages):
+    side = len(board)
+    tables = unit_tables(side)
+    squares, row_of, col_of, box_of, units, full, peers = tables
+    grid = [value for row in board for value in row]
+
+    rows, cols, boxes = [0] * side, [0] * side, [0] * side
+    for i, value in enumerate(grid):
+        if value:
+            bit = 1 << (value - 1)
+            r, c, b = row_of[i], col_of[i], box_of[i]
+            if (rows[r] | cols[c] | boxes[b]) & bit:
+                return None
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+
+    # Cells outside every cage point at a pseudo-cage that allows anything
+    cage_cells = [[r * side + c for r, c in cage['cells']] for cage in cages]
+    cage_sums = [cage['sum'] for cage in cages]
+    cage_of = [len(cages)] * squares
+    for k, cells in enumerate(cage_cells):
+        for i in cells:
+            cage_of[i] = k
+    layout = (cage_cells, cage_sums, cage_of, combination_table(side))
+    return grid, rows, cols, boxes, tables, layout
+
+
+def _cage_masks(grid, rows, cols, boxes, tables, cells, total, table):
+    # Returns (allowed, required) digit masks for the open cells of one cage,
+    # or None if the cage can no longer be completed. Only combinations that
+    # avoid the digits already placed in the cage, and that the open cells
+    # could still hold between them, are considered.
+    squares, row_of, col_of, box_of, units, full, peers = tables
+    placed = left = reach = 0
+    for i in cells:
+        value = grid[i]
+        if value:
+            bit = 1 << (value - 1)
+            if placed & bit:
+                return None
+            placed |= bit
+            total -= value
+        else:
+            left += 1
+            reach |= full & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+    if not left:
+        return (0, 0) if total == 0 else None
+
+    allowed, required = 0, full
+    blocked = placed | (full & ~reach)
+    for combo in table.get((left, total), ()):
+        if not combo & blocked:
+            allowed |= combo
+            required &= combo
+    return (allowed, required) if allowed else None
+
+
+def _propagate(grid, rows, cols, boxes, tables, layout):
+    # Same contract as sudoku_solver._propagate: -2 on a contradiction, -1
+    # when the board is full, otherwise the open cell to branch on
+    squares, row_of, col_of, box_of, units, full, peers = tables
+    cage_cells, cage_sums, cage_of, table = layout
+
+    allowed = []
+    required = []
+    for k, cells in enumerate(cage_cells):
+        masks = _cage_masks(grid, rows, cols, boxes, tables, cells, cage_sums[k], table)
+        if masks is None:
+            return -2
+        allowed.append(masks[0])
+        required.append(masks[1])
+    allowed.append(full)
+    required.append(0)
+
+    def place(i, bit):
+        grid[i] = bit.bit_length()
+        rows[row_of[i]] |= bit
+        cols[col_of[i]] |= bit
+        boxes[box_of[i]] |= bit
+        k = cage_of[i]
+        if k < len(cage_cells):
+            masks = _cage_masks(grid, rows, cols, boxes, tables, cage_cells[k], cage_sums[k], table)
+            if masks is None:
+                return False
+            allowed[k], required[k] = masks
+        return True
+
+    empties = [i for i in range(squares) if not grid[i]]
+    cands = [0] * squares
+    while empties:
+        progress = False
+        best, best_count = -1, 99
+        open_cells = []
+
+        # Naked singles
+        for i in empties:
+            cand = full & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]]) & allowed[cage_of[i]]
+            if not cand:
+                return -2
+            if not cand & (cand - 1):
+                if not place(i, cand):
+                    return -2
+                progress = True
+            else:
+                cands[i] = cand
+                open_cells.append(i)
+                if not progress:
+                    count = cand.bit_count()
+                    if count < best_count:
+                        best, best_count = i, count
+
+        empties = open_cells
+        if progress:
+            continue
+        if not empties:
+            return -1
+
+        # Hidden singles in rows, columns, boxes and cages. Digits a cage must
+        # hold count as required there just like every digit in a unit.
+        for unit, need in [(unit, full) for unit in units] + list(zip(cage_cells, required)):
+            once = twice = placed = 0
+            for i in unit:
+                value = grid[i]
+                if value:
+                    placed |= 1 << (value - 1)
+                    continue
+                cand = cands[i]
+                twice |= once & cand
+                once |= cand
+            need &= ~placed
+            if need & ~once:
+                return -2
+            hidden = need & once & ~twice
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for i in unit:
+                    if grid[i]:
+                        continue
+                    cand = (full & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+                            & allowed[cage_of[i]])
+                    if cand & bit:
+                        if not place(i, bit):
+                            return -2
+                        progress = True
+                        break
+
+        if not progress:
+            return best
+        empties = [i for i in empties if not grid[i]]
+
+    return -1
+
+
+def _search(grid, rows, cols, boxes, tables, layout, limit, found, budget):
+    budget[0] -= 1
+    if budget[0] < 0:
+        raise SearchLimitExceeded
+    cell = _propagate(grid, rows, cols, boxes, tables, layout)
+    if cell == -2:
+        return
+    if cell == -1:
+        found.append(grid)
+        return
+
+    squares, row_of, col_of, box_of, units, full, peers = tables
+    cage_cells, cage_sums, cage_of, table = layout
+    r, c, b = row_of[cell], col_of[cell], box_of[cell]
+    cand = full & ~(rows[r] | cols[c] | boxes[b])
+    k = cage_of[cell]
+    if k < len(cage_cells):
+        masks = _cage_masks(grid, rows, cols, boxes, tables, cage_cells[k], cage_sums[k], table)
+        cand &= masks[0] if masks else 0
+    while cand:
+        bit = cand & -cand
+        cand ^= bit
+        g, ro, co, bo = grid[:], rows[:], cols[:], boxes[:]
+        g[cell] = bit.bit_length()
+        ro[r] |= bit
+        co[c] |= bit
+        bo[b] |= bit
+        _search(g, ro, co, bo, tables, layout, limit, found, budget)
+        if len(found) >= limit:
+            return
+
+
+def solutions(board, cages, limit=1, node_limit=None):
+    """Return up to limit solved copies of board under the cage sums.
+
+    board may have no givens at all (every cell 0), in which case the cages
+    alone decide the solution. With node_limit set, SearchLimitExceeded is
+    raised once the search has visited that many nodes.
+    """
+    side = len(board)
+    state = _load(board, cages)
+    if state is None:
+        return []
+    found = []
+    budget = new_budget(node_limit)
+    try:
+        _search(*state, limit, found, budget)
+    finally:
+        record_nodes('killer', budget)
+    return [[grid[r * side:(r + 1) * side] for r in range(side)] for grid in found]
+
+
+def count_solutions(board, cages, limit=2, node_limit=None):
+    """Count the solutions of a Killer board, stopping once limit are found."""
+    return len(solutions(board, cages, limit, node_limit))
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import string
+from types import MappingProxyType
+from typing import NamedTuple
+
+# Compiled logic puzzle configuration.
+#
+# config.json is parsed, validated and turned into a LogicConfig once; the
+# result is saved next to it (config.json -> config.json.compiled) as plain
+# JSON, together with the SHA-256 of the JSON it came from, and reused for as
+# long as that hash matches. The cache is config.json's own shape with the
+# templates deduplicated, and goes through compile_config() again when
+# loaded, so it gets the same checks as the file it came from. Loaded
+# configs are also kept in memory per file and shared, so LogicConfig is
+# immutable: tuples, and read-only mapping views.
+
+TEMPLATE_FIELDS = frozenset({'name1', 'name2', 'item1', 'item2', 'category'})
+CACHE_VERSION = 3
+
+_loaded = {}
+
+
+class LogicConfig(NamedTuple):
+    categories: tuple  # category names, in config order
+    values: tuple  # the values of each category, aligned with categories
+    category_index: MappingProxyType  # category name -> position in categories
+    templates: MappingProxyType  # (clue type, frozenset of fields) -> tuple of templates
+
+    def __reduce__(self):
+        # Mapping views cannot be pickled, e.g. to send to a process pool
+        return compile_config, (_to_json(self),)
+
+
+def _to_json(config):
+    # config.json data that compiles back to config
+    clue_templates = {}
+    for (clue_type, _), texts in config.templates.items():
+        clue_templates.setdefault(clue_type, []).extend(texts)
+    return {
+        'categories': {name: list(values) for name, values in zip(config.categories, config.values)},
+        'clue_templates': clue_templates,
+    }
+
+
+def template_fields(template):
+    """Return the set of fields a format template uses.
+
+    Raises ValueError for malformed templates, positional or attribute
+    fields, and fields outside TEMPLATE_FIELDS.
+    """
+    fields = set()
+    for _, field, _, _ in string.Formatter().parse(template):
+        if field is None:
+            continue
+        if field not in TEMPLATE_FIELDS:
+            raise ValueError(f"Unknown field '{{{field}}}' in template '{template}'")
+        fields.add(field)
+    return frozenset(fields)
+
+
+def compile_config(data):
+    """Validate parsed config.json data and return a LogicConfig."""
+    categories = data.get('categories') if isinstance(data, dict) else None
+    if not isinstance(categories, dict) or not categories:
+        raise ValueError("Config needs a non-empty 'categories' object")
+    names, values = [], []
+    for name, category_values in categories.items():
+        if (not isinstance(category_values, list) or not category_values
+                or not all(isinstance(value, str) and value for value in category_values)):
+            raise ValueError(f"Category '{name}' must be a non-empty list of strings")
+        if len(set(category_values)) != len(category_values):
+            raise ValueError(f"Category '{name}' lists a value more than once")
+        names.append(name)
+        values.append(tuple(category_values))
+
+    clue_templates = data.get('clue_templates')
+    if not isinstance(clue_templates, dict):
+        raise ValueError("Config needs a 'clue_templates' object")
+    templates = {}
+    for clue_type, texts in clue_templates.items():
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise ValueError(f"Clue templates for '{clue_type}' must be a list of strings")
+        for text in dict.fromkeys(texts):  # config.json repeats a few
+            key = (clue_type, template_fields(text))
+            templates[key] = templates.get(key, ()) + (text,)
+
+    return LogicConfig(
+        categories=tuple(names),
+        values=tuple(values),
+        category_index=MappingProxyType({name: i for i, name in enumerate(names)}),
+        templates=MappingProxyType(templates),
+    )
+
+
+def cache_path(path):
+    return path + '.compiled'
+
+
+def load_config(path):
+    """Return the LogicConfig for a config.json, reading its cache while it is unchanged."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key in _loaded:
+        return _loaded[key]
+
+    with open(path, 'rb') as file:
+        raw = file.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    config = None
+    try:
+        with open(cache_path(path), 'rb') as file:
+            cached = json.load(file)
+        if cached['version'] == CACHE_VERSION and cached['digest'] == digest:
+            config = compile_config(cached['config'])
+    except (OSError, ValueError, TypeError, KeyError):
+        pass  # missing, unreadable or outdated cache
+
+    if config is None:
+        config = compile_config(json.loads(raw))
+        # Written under a temporary name so readers never see a partial
+        # cache; a read-only directory just means compiling every time
+        tmp_path = f"{cache_path(path)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump({'version': CACHE_VERSION, 'digest': digest, 'config': _to_json(config)}, file)
+            os.replace(tmp_path, cache_path(path))
+        except OSError:
+            pass
+    _loaded[key] = config
+    return config
@@ -0,0 +1,343 @@
+import random
+from itertools import accumulate
+
+from puzzlegen import metrics
+
+# Solver for logic grid puzzles.
+#
+# Every name holds exactly one item from each category, so a puzzle with n
+# names and k categories is a set of k permutations. The state is a list of
+# n * k bitmasks, masks[name * k + category], with bit v set while item v of
+# that category is still possible for that name.
+#
+# Clues are dicts:
+#
+#   {'type': 'positive', 'name': i, 'category': c, 'item': v}
+#       name i has item v of category c
+#   {'type': 'negative', 'name': i, 'category': c, 'item': v}
+#       name i does not have it
+#   {'type': 'exclusive', 'category': c, 'item': v, 'category2': d, 'item2': w}
+#       item v of c and item w of d (c != d) belong to different names
+#
+# Propagation applies naked and hidden singles within each category and the
+# exclusive links between categories; the search branches on the open
+# (name, category) with the fewest candidates. Propagation works from a
+# queue of changed cells and rechecks hidden singles only in categories that
+# changed, so a new clue or a branch costs what it touches rather than a
+# rescan of the whole grid.
+#
+# make_clues() only builds puzzles that propagation alone solves. Propagation
+# never removes a true candidate, so a grid it settles completely has
+# exactly one solution, and both adding and dropping clues are checked by
+# propagating rather than searching.
+
+
+_columns = {}  # (names, categories) -> cells of each category
+
+
+def new_state(num_names, num_categories):
+    return [(1 << num_names) - 1] * (num_names * num_categories)
+
+
+def apply_clue(masks, num_categories, clue, links):
+    """Apply one clue to masks, adding exclusive clues to links.
+
+    links maps (category, item bit) to a tuple of (category, item bit)
+    pairs that whoever holds the first item cannot hold. The tuples are
+    never changed in place, so a shallow copy of links is a full copy.
+    Returns the cells propagate() has to look at again.
+    """
+    if clue['type'] == 'exclusive':
+        first = (clue['category'], 1 << clue['item'])
+        second = (clue['category2'], 1 << clue['item2'])
+        links[first] = links.get(first, ()) + (second,)
+        links[second] = links.get(second, ()) + (first,)
+        # Only a name already holding either item has to drop the other;
+        # the rest meet the link once they settle
+        return [i for c, bit in (first, second) for i in range(c, len(masks), num_categories) if masks[i] == bit]
+    i = clue['name'] * num_categories + clue['category']
+    if clue['type'] == 'positive':
+        masks[i] &= 1 << clue['item']
+    else:
+        masks[i] &= ~(1 << clue['item'])
+    return [i]
+
+
+def propagate(masks, num_names, num_categories, links, changed=None):
+    """Reduce masks in place; returns False on a contradiction.
+
+    Only the cells in changed (all of them by default) and whatever their
+    reductions reach are looked at, so masks must otherwise already be
+    propagated.
+    """
+    k = num_categories
+    size = num_names * k
+    full = (1 << num_names) - 1
+    if (num_names, k) not in _columns:
+        _columns[num_names, k] = [tuple(range(c, size, k)) for c in range(k)]
+    columns = _columns[num_names, k]
+    queue = list(range(size)) if changed is None else list(changed)
+    while queue:
+        dirty = 0  # categories with a changed cell
+        while queue:
+            i = queue.pop()
+            m = masks[i]
+            if not m:
+                return False
+            c = i % k
+            dirty |= 1 << c
+            if m & (m - 1):
+                continue
+
+            # Naked single: the item is gone from every other name
+            for j in columns[c]:
+                if j != i and masks[j] & m:
+                    masks[j] &= ~m
+                    if not masks[j]:
+                        return False
+                    queue.append(j)
+
+            # Exclusive links: whoever holds one item cannot hold the other
+            if links:
+                base = i - c
+                for d, bit in links.get((c, m), ()):
+                    j = base + d
+                    if masks[j] & bit:
+                        masks[j] &= ~bit
+                        if not masks[j]:
+                            return False
+                        queue.append(j)
+
+        # Hidden singles: an item only one name can still hold
+        for c in range(k):
+            if not dirty >> c & 1:
+                continue
+            once = twice = 0
+            for j in columns[c]:
+                twice |= once & masks[j]
+                once |= masks[j]
+            if once != full:
+                return False
+            hidden = once & ~twice
+            if hidden:
+                for j in columns[c]:
+                    m = masks[j]
+                    if m & hidden and m != m & hidden:
+                        masks[j] = m & hidden
+                        if masks[j] & (masks[j] - 1):
+                            return False  # one name holding two items
+                        queue.append(j)
+    return True
+
+
+def _search(masks, num_names, num_categories, links, limit, found, changed=None):
+    if not propagate(masks, num_names, num_categories, links, changed):
+        return
+    best, best_count = -1, num_names + 1
+    for i, m in enumerate(masks):
+        if m & (m - 1):
+            count = m.bit_count()
+            if count < best_count:
+                best, best_count = i, count
+    if best < 0:
+        found.append(masks)
+        return
+    m = masks[best]
+    while m:
+        bit = m & -m
+        m ^= bit
+        branch = masks[:]
+        branch[best] = bit
+        _search(branch, num_names, num_categories, links, limit, found, (best,))
+        if len(found) >= limit:
+            return
+
+
+def solutions(num_names, num_categories, clues, limit=1):
+    """Return up to limit solutions as lists of fully reduced masks."""
+    masks = new_state(num_names, num_categories)
+    links = {}
+    for clue in clues:
+        apply_clue(masks, num_categories, clue, links)
+    found = []
+    _search(masks, num_names, num_categories, links, limit, found)
+    return found
+
+
+def count_solutions(num_names, num_categories, clues, limit=2):
+    """Count the solutions of a clue set, stopping once limit are found."""
+    return len(solutions(num_names, num_categories, clues, limit))
+
+
+def random_solution(num_names, num_categories):
+    """Return a hidden assignment: solution[c][name] is the item index."""
+    return [random.sample(range(num_names), num_names) for _ in range(num_categories)]
+
+
+def solution_matrices(solution):
+    """Return the answer grid of solution, one matrix per pair of categories.
+
+    Keys are (r, c) with c < r and Names as category 0; each matrix is a
+    bitmask per row, with bit j of row i set when item i of r and item j of
+    c go together.
+    """
+    n = len(solution[0])
+    columns = [list(range(n))] + list(solution)  # item index of each name, per category
+    matrices = {}
+    for r in range(1, len(columns)):
+        for c in range(r):
+            rows = [0] * n
+            for name in range(n):
+                rows[columns[r][name]] |= 1 << columns[c][name]
+            matrices[(r, c)] = rows
+    return matrices
+
+
+def true_clues(solution):
+    """Return every clue of each type that holds for solution."""
+    num_categories = len(solution)
+    num_names = len(solution[0]) if solution else 0
+    owner = [{v: name for name, v in enumerate(column)} for column in solution]
+    found = {'positive': [], 'negative': [], 'exclusive': []}
+    for name in range(num_names):
+        for c in range(num_categories):
+            for v in range(num_names):
+                clue_type = 'positive' if solution[c][name] == v else 'negative'
+                found[clue_type].append({'type': clue_type, 'name': name, 'category': c, 'item': v})
+    for c in range(num_categories):
+        for d in range(c + 1, num_categories):
+            for v in range(num_names):
+                for w in range(num_names):
+                    if owner[c][v] != owner[d][w]:
+                        found['exclusive'].append({'type': 'exclusive', 'category': c, 'item': v,
+                                                   'category2': d, 'item2': w})
+    return found
+
+
+def make_clues(solution, weights):
+    """Draw true clues until propagation solves the grid, then drop redundant ones.
+
+    weights maps clue type to its relative frequency. Returns the clues in
+    random order; they leave solution as the only answer, and can be worked
+    through without guessing.
+    """
+    num_categories = len(solution)
+    num_names = len(solution[0])
+    # Every clue of a type, true or not, by index (see _clue_at); only the
+    # ones drawn are built
+    n, k = num_names, num_categories
+    pools = {'positive': list(range(n * k)), 'negative': list(range(n * k * n)),
+             'exclusive': list(range(k * (k - 1) // 2 * n * n))}
+    pairs = [(c, d) for c in range(k) for d in range(c + 1, k)]
+    owner = [{v: name for name, v in enumerate(column)} for column in solution]
+
+    clues = []
+    masks = new_state(num_names, k)
+    links = {}
+    types = None
+    while not _solved(masks):
+        if types is None:
+            # Worked out again only once a pool runs dry
+            types = [t for t in pools if pools[t] and weights.get(t)] or [t for t in pools if pools[t]]
+            cum_weights = list(accumulate(weights.get(t) or 1 for t in types))
+        clue_type = random.choices(types, cum_weights=cum_weights)[0]
+
+        # A random true clue of that type, each candidate swapped to the
+        # end to pop it; clues the grid already implies add nothing, and
+        # stay implied as it narrows, so they are dropped for good
+        pool = pools[clue_type]
+        clue = None
+        while clue is None and pool:
+            j = random.randrange(len(pool))
+            pool[j], pool[-1] = pool[-1], pool[j]
+            clue = _clue_at(solution, owner, pairs, clue_type, pool.pop())
+        if not pool:
+            types = None
+        if clue is None or _entailed(masks, num_names, k, clue):
+            continue
+        clues.append(clue)
+        propagate(masks, num_names, k, links, apply_clue(masks, k, clue, links))
+
+    # They solve the grid, so minimize_clues' check can be skipped. In draw
+    # order the early clues, which later ones most often imply, are the
+    # first to go
+    drawn = len(clues)
+    clues = _minimize(_with_clues((new_state(num_names, k), {}), k, [], num_names), clues, num_names, k)
+    metrics.count('logic.clues_drawn', drawn)
+    metrics.count('logic.clues_dropped', drawn - len(clues))
+    random.shuffle(clues)
+    return clues
+
+
+def _clue_at(solution, owner, pairs, clue_type, index):
+    # The clue_type clue at index in make_clues' pools, or None if it does
+    # not hold for solution
+    n = len(solution[0])
+    if clue_type == 'exclusive':
+        pair, rest = divmod(index, n * n)
+        (c, d), (v, w) = pairs[pair], divmod(rest, n)
+        if owner[c][v] == owner[d][w]:
+            return None
+        return {'type': 'exclusive', 'category': c, 'item': v, 'category2': d, 'item2': w}
+    if clue_type == 'positive':
+        name, c = divmod(index, len(solution))
+        return {'type': 'positive', 'name': name, 'category': c, 'item': solution[c][name]}
+    cell, v = divmod(index, n)
+    name, c = divmod(cell, len(solution))
+    if solution[c][name] == v:
+        return None
+    return {'type': 'negative', 'name': name, 'category': c, 'item': v}
+
+
+def _with_clues(state, num_categories, clues, num_names):
+    # A propagated copy of state with clues added, or None on a contradiction
+    masks, links = state[0][:], dict(state[1])
+    changed = []
+    for clue in clues:
+        changed += apply_clue(masks, num_categories, clue, links)
+    if not propagate(masks, num_names, num_categories, links, changed):
+        return None
+    return masks, links
+
+
+def _entailed(masks, num_names, num_categories, clue):
+    if clue['type'] == 'exclusive':
+        c, bit, d, bit2 = clue['category'], 1 << clue['item'], clue['category2'], 1 << clue['item2']
+        return not any(masks[base + c] & bit and masks[base + d] & bit2
+                       for base in range(0, num_names * num_categories, num_categories))
+    m = masks[clue['name'] * num_categories + clue['category']]
+    bit = 1 << clue['item']
+    return m == bit if clue['type'] == 'positive' else not m & bit
+
+
+def _solved(masks):
+    # Every cell down to one candidate
+    return sum(map(int.bit_count, masks)) == len(masks)
+
+
+def _minimize(state, clues, num_names, num_categories):
+    # state holds every clue outside this segment: the ones before it as
+    # already decided, the ones after it all still present
+    if _solved(state[0]):
+        return []  # solved without any of them
+    if len(clues) == 1:
+        return clues  # the rest leave the grid open, so this one stays
+    half = len(clues) // 2
+    left, right = clues[:half], clues[half:]
+    kept = _minimize(_with_clues(state, num_categories, right, num_names), left, num_names, num_categories)
+    return kept + _minimize(_with_clues(state, num_categories, kept, num_names), right, num_names, num_categories)
+
+
+def minimize_clues(num_names, num_categories, clues):
+    """Drop clues, in order, whenever propagating the rest still solves the grid.
+
+    Same result as removing them one at a time and re-propagating, but the
+    propagated state is built up by divide and conquer, so each clue is only
+    applied O(log n) times instead of once per candidate removal. Clues that
+    propagation cannot solve are returned unchanged.
+    """
+    state = _with_clues((new_state(num_names, num_categories), {}), num_categories, [], num_names)
+    full = _with_clues(state, num_categories, clues, num_names)
+    if full is None or not _solved(full[0]):
+        return clues
+    return _minimize(state, clues, num_names, num_categories)
@@ -0,0 +1,127 @@
+import cProfile
+import contextlib
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+
+# Counters and stage timers for the generation pipelines.
+#
+# Metrics are off unless enable() is called (the batch command line does so
+# for --metrics), and while they are off count() and timer() return at once
+# after checking one flag. Hot loops never call in here per step: they keep
+# a local tally (search nodes, rejected draws, backtracks) and hand it over
+# once per call, so the cost when disabled is a function call per puzzle or
+# page, not per node.
+#
+# Names are dotted, "<kind>.<what>", e.g. sudoku.search_nodes or
+# killer.rejected_cells. Timers add up calls and seconds per name.
+#
+# Puzzles generated on a process pool are counted in the workers;
+# puzzlegen.batch ships each chunk's snapshot() back and merge()s it here,
+# so report() covers the whole batch either way. Manifest jobs run on
+# threads, so updates and reads go through one lock.
+
+enabled = False
+counters = defaultdict(int)
+timers = defaultdict(lambda: [0, 0.0])  # name -> [calls, seconds]
+_lock = threading.Lock()
+
+_no_timer = contextlib.nullcontext()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        counters.clear()
+        timers.clear()
+
+
+def count(name, n=1):
+    if enabled:
+        with _lock:
+            counters[name] += n
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            entry = timers[self.name]
+            entry[0] += 1
+            entry[1] += elapsed
+
+
+def timer(name):
+    """Return a context manager timing its block under name, if enabled."""
+    return _Timer(name) if enabled else _no_timer
+
+
+def snapshot():
+    """Return the current counters and timers as a plain (picklable) dict."""
+    with _lock:
+        return {'counters': dict(counters), 'timers': {name: list(entry) for name, entry in timers.items()}}
+
+
+def merge(snap):
+    """Add a snapshot() taken elsewhere, e.g. in a worker process."""
+    with _lock:
+        for name, n in snap['counters'].items():
+            counters[name] += n
+        for name, (calls, seconds) in snap['timers'].items():
+            entry = timers[name]
+            entry[0] += calls
+            entry[1] += seconds
+
+
+def report():
+    """Return the counters and timers as text, one line per name."""
+    snap = snapshot()
+    lines = []
+    if snap['timers']:
+        lines.append(f"{'timer':<36}{'calls':>9}{'total s':>11}{'mean ms':>11}")
+        for name, (calls, seconds) in sorted(snap['timers'].items()):
+            lines.append(f"{name:<36}{calls:>9}{seconds:>11.3f}{seconds / calls * 1000:>11.3f}")
+    if snap['counters']:
+        lines.append(f"{'counter':<36}{'total':>9}")
+        for name, n in sorted(snap['counters'].items()):
+            lines.append(f"{name:<36}{n:>9}")
+    return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def profile(path, sort='cumulative', limit=30):
+    """Run the block under cProfile, dumping pstats data to path.
+
+    Only the calling process is profiled; run a batch with one worker to
+    include generation. The top `limit` entries by `sort` are also written
+    to path + '.txt'. Load the dump with pstats or a viewer such as snakeviz.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        profiler.dump_stats(path)
+        with open(path + '.txt', 'w') as file:
+            pstats.Stats(profiler, stream=file).sort_stats(sort).print_stats(limit)
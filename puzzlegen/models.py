@@ -0,0 +1,155 @@
+from puzzlegen.logic_solver import solution_matrices
+from puzzlegen.sudoku_board import flatten, side_of, to_rows
+
+# Typed puzzle records, one class per puzzle kind.
+#
+# Each generator script's generate_puzzle returns a plain tuple in the form
+# its write_pdf draws (see puzzlegen.backends): NumPy grids, dicts of cage
+# cells, answer matrices. from_entry() turns such a tuple into a model that
+# holds only plain data, and entry() turns the model back into the tuple,
+# so a batch can be generated once, kept in a puzzle file (see
+# puzzlegen.puzzlefile) and drawn later or on another machine.
+#
+# Models keep only what cannot be worked out from the rest: Killer cage sums
+# follow from the solution, the word list from the placed words, and the
+# logic answer grid from the hidden assignment. Boards are flat bytearrays
+# (see sudoku_board).
+
+# Maps every given (non-zero byte) to 0xff
+_GIVEN_MASK = bytes.maketrans(bytes(range(256)), b'\x00' + b'\xff' * 255)
+
+
+class _Model:
+    __slots__ = ()
+    kind = None
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+def _check_givens(puzzle, solution):
+    if len(puzzle) != len(solution):
+        raise ValueError("Puzzle and solution differ in size")
+    # Masking the solution down to the given cells must give the puzzle back
+    mask = int.from_bytes(puzzle.translate(_GIVEN_MASK), 'little')
+    if int.from_bytes(solution, 'little') & mask != int.from_bytes(puzzle, 'little'):
+        raise ValueError("Puzzle has a given that disagrees with the solution")
+
+
+class SudokuPuzzle(_Model):
+    __slots__ = ('puzzle', 'solution')
+    kind = 'sudoku'
+
+    def __init__(self, puzzle, solution):
+        self.puzzle = flatten(puzzle)
+        self.solution = flatten(solution)
+        _check_givens(self.puzzle, self.solution)
+
+    @classmethod
+    def from_entry(cls, entry):
+        puzzle, solution = entry
+        return cls(puzzle, solution)
+
+    def entry(self):
+        return self.puzzle, self.solution
+
+
+class KillerPuzzle(_Model):
+    __slots__ = ('puzzle', 'solution', 'cages')
+    kind = 'killer'
+
+    def __init__(self, puzzle, solution, cages):
+        # cages is a list of cages, each a list of (row, col) cells. They are
+        # kept in row-major order of their cells, and ordered by first cell.
+        self.puzzle = flatten(puzzle)
+        self.solution = flatten(solution)
+        _check_givens(self.puzzle, self.solution)
+        self.cages = tuple(sorted(tuple(sorted((int(r), int(c)) for r, c in cells)) for cells in cages))
+
+    @classmethod
+    def from_entry(cls, entry):
+        puzzle, solution, cages = entry
+        model = cls(puzzle, solution, [cage['cells'] for cage in cages])
+        side = side_of(model.solution)
+        for cage in cages:
+            if cage['sum'] != sum(model.solution[r * side + c] for r, c in cage['cells']):
+                raise ValueError(f"Cage {cage['id']} does not add up to its sum")
+        return model
+
+    def entry(self):
+        side = side_of(self.solution)
+        cages = [{'id': i + 1, 'cells': list(cells), 'sum': sum(self.solution[r * side + c] for r, c in cells)}
+                 for i, cells in enumerate(self.cages)]
+        return to_rows(self.puzzle), to_rows(self.solution), cages
+
+
+class WordSearchPuzzle(_Model):
+    __slots__ = ('grid', 'positions')
+    kind = 'wordsearch'
+
+    def __init__(self, grid, positions):
+        # grid is one string per row; positions the (word, cells) of each
+        # placed word, in the order the words were given
+        self.grid = tuple(''.join(row) for row in grid)
+        if any(len(row) != len(self.grid) for row in self.grid):
+            raise ValueError("Word search grid is not square")
+        self.positions = tuple((str(word), tuple((int(r), int(c)) for r, c in cells)) for word, cells in positions)
+
+    @property
+    def words(self):
+        return sorted(word for word, _ in self.positions)
+
+    @classmethod
+    def from_entry(cls, entry):
+        grid, words, positions = entry
+        return cls(grid, positions)
+
+    def entry(self):
+        return self.grid, self.words, [(word, list(cells)) for word, cells in self.positions]
+
+
+class LogicPuzzle(_Model):
+    __slots__ = ('categories', 'items', 'clues', 'solution')
+    kind = 'logic'
+
+    def __init__(self, categories, items, clues, solution):
+        # categories and items start with Names; solution[c][name] is the
+        # index of the item of category c + 1 that goes with name (the form
+        # of logic_solver.random_solution)
+        self.categories = tuple(categories)
+        self.items = tuple(tuple(category_items) for category_items in items)
+        self.clues = tuple(clues)
+        self.solution = tuple(tuple(column) for column in solution)
+        if len(self.items) != len(self.categories) or len(self.solution) != len(self.categories) - 1:
+            raise ValueError("Logic puzzle needs items for every category and an answer for all but Names")
+
+    @classmethod
+    def from_entry(cls, entry):
+        categories, items, clues, correct_answers = entry
+        # Category r against Names: bit name of row i is set when item i goes with name
+        solution = []
+        for r in range(1, len(categories)):
+            column = [0] * len(items[0])
+            for i, row in enumerate(correct_answers[(r, 0)]):
+                column[row.bit_length() - 1] = i
+            solution.append(column)
+        return cls(categories, items, clues, solution)
+
+    def entry(self):
+        return (list(self.categories), [list(category_items) for category_items in self.items],
+                list(self.clues), solution_matrices(self.solution))
+
+
+MODELS = {model.kind: model for model in (SudokuPuzzle, KillerPuzzle, WordSearchPuzzle, LogicPuzzle)}
+
+
+def from_entry(kind, entry):
+    """Return the model of one generate_puzzle result of the given kind."""
+    if kind not in MODELS:
+        raise ValueError(f"Unknown puzzle kind '{kind}', expected one of {sorted(MODELS)}")
+    return MODELS[kind].from_entry(entry)
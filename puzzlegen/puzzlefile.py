@@ -0,0 +1,357 @@
+import math
+
+from puzzlegen.models import MODELS, KillerPuzzle, LogicPuzzle, SudokuPuzzle, WordSearchPuzzle
+from puzzlegen.sudoku_board import side_of
+
+# Compact binary puzzle records and files of them.
+#
+# dumps() packs one model (see puzzlegen.models) into a record that starts
+# with a kind byte (KIND_CODES), followed by:
+#
+#   sudoku      base byte, then the board number (below)
+#   killer      base byte, the board number, then one bit per pair of
+#               neighbouring cells, set when both are in the same cage
+#   wordsearch  varint side, the letters as one base-26 number, a varint word
+#               count, then per word a varint start cell, a direction byte
+#               (WORD_STEPS) and a length byte
+#   logic       varint category and name counts, the categories, items and
+#               clues as length-prefixed UTF-8, then the hidden assignment as
+#               one byte per category and name
+#
+# Every row of a solved board is a permutation of the digits, so the board
+# number stores each row as its rank among the side! permutations, plus one
+# bit per cell for the givens: a 9x9 Sudoku with its solution is a 33-byte
+# record, a 25x25 one 342 bytes. Varints are LEB128.
+#
+# A puzzle file is MAGIC followed by records, each prefixed with its length
+# as a varint. write_puzzles() streams models into one and read_puzzles()
+# streams them back out, a block at a time, so neither side holds the whole
+# batch. A file may mix kinds.
+
+MAGIC = b'PZG\x01'
+KIND_CODES = {'sudoku': 1, 'killer': 2, 'wordsearch': 3, 'logic': 4}
+KINDS = {code: kind for kind, code in KIND_CODES.items()}
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Row and column step of a placed word, in the order of the word search
+# script's DIRECTIONS: H, V, D, A, then the same read backwards
+WORD_STEPS = ((0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1))
+READ_SIZE = 1 << 20
+
+_board_tables = {}
+# Givens as a bit string ('1' for a given) and back to a 0x00/0xff cell mask
+_GIVEN_BITS = bytes.maketrans(bytes(range(256)), b'0' + b'1' * 255)
+_BIT_MASK = bytes.maketrans(b'01', b'\x00\xff')
+
+
+def _write_varint(out, n):
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    # Returns (value, position after it); raises IndexError if data ends first
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _write_text(out, text):
+    data = text.encode('utf-8')
+    _write_varint(out, len(data))
+    out += data
+
+
+def _read_text(data, pos):
+    length, pos = _read_varint(data, pos)
+    if pos + length > len(data):
+        raise IndexError
+    return bytes(data[pos:pos + length]).decode('utf-8'), pos + length
+
+
+def _board_table(side):
+    # Bytes of the board number of a side x side board, the number of
+    # permutations of a row and the factorials ranks are taken apart by
+    if side not in _board_tables:
+        radix = math.factorial(side)
+        size = ((radix ** side << side * side) - 1).bit_length() + 7 >> 3
+        _board_tables[side] = size, radix, [math.factorial(k) for k in range(side - 1, -1, -1)]
+    return _board_tables[side]
+
+
+def _pack_board(out, puzzle, solution):
+    side = side_of(solution)
+    size, radix, _ = _board_table(side)
+    number = 0
+    for r in range(side):
+        # Lehmer code: each digit's index among the digits not yet used
+        remaining = list(range(1, side + 1))
+        rank = 0
+        for digit in solution[r * side:(r + 1) * side]:
+            if digit not in remaining:
+                raise ValueError("Solution row is not a permutation of the digits")
+            i = remaining.index(digit)
+            rank = rank * len(remaining) + i
+            del remaining[i]
+        number = number * radix + rank
+    givens = int(bytes(puzzle).translate(_GIVEN_BITS)[::-1], 2)
+    out += ((number << side * side) | givens).to_bytes(size, 'little')
+
+
+def _unpack_board(data, pos, side):
+    size, radix, factorials = _board_table(side)
+    if pos + size > len(data):
+        raise IndexError
+    number = int.from_bytes(data[pos:pos + size], 'little')
+    squares = side * side
+    givens = number & ((1 << squares) - 1)
+    number >>= squares
+    rows = []
+    for _ in range(side):
+        number, rank = divmod(number, radix)
+        remaining = list(range(1, side + 1))
+        row = []
+        for factorial in factorials:
+            i, rank = divmod(rank, factorial)
+            row.append(remaining.pop(i))
+        rows.append(row)
+    if number:
+        raise ValueError("Board number out of range")
+    rows.reverse()
+    solution = bytearray(digit for row in rows for digit in row)
+    # The givens are the solution's digits under a 0xff mask
+    mask = format(givens, f'0{squares}b')[::-1].encode().translate(_BIT_MASK)
+    puzzle = (int.from_bytes(solution, 'little') & int.from_bytes(mask, 'little')).to_bytes(squares, 'little')
+    return bytearray(puzzle), solution, pos + size
+
+
+def _cage_edges(side):
+    # Each pair of neighbouring cells, in the order their bits are stored
+    for r in range(side):
+        for c in range(side):
+            if c + 1 < side:
+                yield (r, c), (r, c + 1)
+            if r + 1 < side:
+                yield (r, c), (r + 1, c)
+
+
+def _cages_from_edges(side, joined):
+    # Cages are the connected groups of cells joined by set bits
+    parent = list(range(side * side))
+
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    for k, ((r1, c1), (r2, c2)) in enumerate(_cage_edges(side)):
+        if joined >> k & 1:
+            parent[find(r1 * side + c1)] = find(r2 * side + c2)
+    groups = {}
+    for p in range(side * side):
+        groups.setdefault(find(p), []).append((p // side, p % side))
+    return list(groups.values())
+
+
+def _pack_killer(out, model):
+    side = side_of(model.solution)
+    _pack_board(out, model.puzzle, model.solution)
+    cage_of = {cell: i for i, cells in enumerate(model.cages) for cell in cells}
+    if len(cage_of) != side * side:
+        raise ValueError("Cages must cover every cell exactly once")
+    joined = 0
+    for k, (a, b) in enumerate(_cage_edges(side)):
+        if cage_of[a] == cage_of[b]:
+            joined |= 1 << k
+    # A cage is only recovered from its edges if its cells are connected
+    if len(_cages_from_edges(side, joined)) != len(model.cages):
+        raise ValueError("Cages must be connected")
+    out += joined.to_bytes((2 * side * (side - 1) + 7) // 8, 'little')
+
+
+def _pack_wordsearch(out, model):
+    side = len(model.grid)
+    _write_varint(out, side)
+    number = 0
+    for row in model.grid:
+        for letter in row:
+            if letter not in LETTERS or not letter:
+                raise ValueError(f"Word search grids can only hold the letters {LETTERS}")
+            number = number * 26 + LETTERS.index(letter)
+    out += number.to_bytes(((26 ** (side * side)) - 1).bit_length() + 7 >> 3, 'little')
+    _write_varint(out, len(model.positions))
+    for word, cells in model.positions:
+        (r, c), length = cells[0], len(cells)
+        step = (cells[1][0] - r, cells[1][1] - c) if length > 1 else WORD_STEPS[0]
+        if (step not in WORD_STEPS or length != len(word) or length > 255
+                or any(cells[k] != (r + step[0] * k, c + step[1] * k) for k in range(length))
+                or any(model.grid[rr][cc] != letter for (rr, cc), letter in zip(cells, word))):
+            raise ValueError(f"'{word}' is not placed on a straight line in the grid")
+        _write_varint(out, r * side + c)
+        out.append(WORD_STEPS.index(step))
+        out.append(length)
+
+
+def _unpack_wordsearch(data, pos):
+    side, pos = _read_varint(data, pos)
+    size = ((26 ** (side * side)) - 1).bit_length() + 7 >> 3
+    if pos + size > len(data):
+        raise IndexError
+    number = int.from_bytes(data[pos:pos + size], 'little')
+    pos += size
+    letters = []
+    for _ in range(side * side):
+        number, i = divmod(number, 26)
+        letters.append(LETTERS[i])
+    text = ''.join(reversed(letters))
+    grid = [text[r * side:(r + 1) * side] for r in range(side)]
+    count, pos = _read_varint(data, pos)
+    positions = []
+    for _ in range(count):
+        start, pos = _read_varint(data, pos)
+        (dr, dc), length = WORD_STEPS[data[pos]], data[pos + 1]
+        pos += 2
+        cells = [(start // side + dr * k, start % side + dc * k) for k in range(length)]
+        positions.append((''.join(grid[r][c] for r, c in cells), cells))
+    return WordSearchPuzzle(grid, positions), pos
+
+
+def _pack_logic(out, model):
+    names = len(model.items[0])
+    _write_varint(out, len(model.categories))
+    _write_varint(out, names)
+    for text in model.categories:
+        _write_text(out, text)
+    for category_items in model.items:
+        if len(category_items) != names:
+            raise ValueError("Every logic puzzle category needs as many items as there are names")
+        for text in category_items:
+            _write_text(out, text)
+    _write_varint(out, len(model.clues))
+    for text in model.clues:
+        _write_text(out, text)
+    for column in model.solution:
+        out += bytes(column)
+
+
+def _unpack_logic(data, pos):
+    num_categories, pos = _read_varint(data, pos)
+    names, pos = _read_varint(data, pos)
+    categories = []
+    for _ in range(num_categories):
+        text, pos = _read_text(data, pos)
+        categories.append(text)
+    items = []
+    for _ in range(num_categories):
+        category_items = []
+        for _ in range(names):
+            text, pos = _read_text(data, pos)
+            category_items.append(text)
+        items.append(category_items)
+    count, pos = _read_varint(data, pos)
+    clues = []
+    for _ in range(count):
+        text, pos = _read_text(data, pos)
+        clues.append(text)
+    end = pos + (num_categories - 1) * names
+    if end > len(data):
+        raise IndexError
+    solution = [list(data[p:p + names]) for p in range(pos, end, names)]
+    return LogicPuzzle(categories, items, clues, solution), end
+
+
+def dumps(model):
+    """Return the binary record of one puzzle model."""
+    if type(model) not in MODELS.values():
+        raise ValueError(f"Cannot pack {type(model).__name__}, expected a puzzlegen.models puzzle")
+    out = bytearray([KIND_CODES[model.kind]])
+    if model.kind in ('sudoku', 'killer'):
+        out.append(math.isqrt(side_of(model.solution)))
+        if model.kind == 'sudoku':
+            _pack_board(out, model.puzzle, model.solution)
+        else:
+            _pack_killer(out, model)
+    elif model.kind == 'wordsearch':
+        _pack_wordsearch(out, model)
+    else:
+        _pack_logic(out, model)
+    return bytes(out)
+
+
+def loads(data):
+    """Return the puzzle model packed in a record from dumps()."""
+    try:
+        kind = KINDS.get(data[0])
+        if kind in ('sudoku', 'killer'):
+            side = data[1] * data[1]
+            puzzle, solution, pos = _unpack_board(data, 2, side)
+            if kind == 'sudoku':
+                model = SudokuPuzzle(puzzle, solution)
+            else:
+                size = (2 * side * (side - 1) + 7) // 8
+                if pos + size > len(data):
+                    raise IndexError
+                joined = int.from_bytes(data[pos:pos + size], 'little')
+                model = KillerPuzzle(puzzle, solution, _cages_from_edges(side, joined))
+                pos += size
+        elif kind == 'wordsearch':
+            model, pos = _unpack_wordsearch(data, 1)
+        elif kind == 'logic':
+            model, pos = _unpack_logic(data, 1)
+        else:
+            raise ValueError("Unknown puzzle kind in record")
+    except IndexError:
+        raise ValueError("Puzzle record is cut short") from None
+    if pos != len(data):
+        raise ValueError("Puzzle record has trailing bytes")
+    return model
+
+
+def write_puzzles(path, puzzles):
+    """Write puzzle models to a new puzzle file as they arrive; returns how many."""
+    count = 0
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        header = bytearray()
+        for model in puzzles:
+            record = dumps(model)
+            header.clear()
+            _write_varint(header, len(record))
+            file.write(header)
+            file.write(record)
+            count += 1
+    return count
+
+
+def read_puzzles(path):
+    """Yield the puzzle models in a puzzle file, in order."""
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a puzzle file")
+        buffer = bytearray()
+        pos = 0
+        while True:
+            try:
+                length, start = _read_varint(buffer, pos)
+                complete = start + length <= len(buffer)
+            except IndexError:
+                complete = False
+            if not complete:
+                block = file.read(READ_SIZE)
+                if not block:
+                    if pos < len(buffer):
+                        raise ValueError(f"{path} ends in the middle of a record")
+                    return
+                del buffer[:pos]
+                buffer += block
+                pos = 0
+                continue
+            yield loads(buffer[start:start + length])
+            pos = start + length
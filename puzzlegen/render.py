@@ -0,0 +1,37 @@
+import math
+import weakref
+
+# Reusable reportlab drawing pieces.
+#
+# The empty Sudoku grid is identical on every page, so it is drawn once per
+# document into a Form XObject and each page only references it. Forms
+# belong to a single PDF document, so the cache is keyed by canvas first and
+# then by page size, margin and board side.
+
+_grid_forms = weakref.WeakKeyDictionary()
+
+
+def sudoku_grid_form(canvas, width, height, margin, side=9):
+    """Return the name of a form holding the empty side x side grid for this canvas."""
+    forms = _grid_forms.setdefault(canvas, {})
+    key = (width, height, margin, side)
+    if key not in forms:
+        name = f"SudokuGrid{len(forms)}"
+        canvas.beginForm(name)
+        base = math.isqrt(side)
+        cell_size = (width - 2 * margin) / side
+        for i in range(side):
+            for j in range(side):
+                x = margin + j * cell_size
+                y = height - margin - (i + 1) * cell_size
+                canvas.rect(x, y, cell_size, cell_size)
+
+        # Draw thicker lines for the boxes
+        for i in range(side + 1):
+            line_width = 2 if i % base == 0 else 1
+            canvas.setLineWidth(line_width)
+            canvas.line(margin, height - margin - i * cell_size, margin + side * cell_size, height - margin - i * cell_size)
+            canvas.line(margin + i * cell_size, height - margin, margin + i * cell_size, height - margin - side * cell_size)
+        canvas.endForm()
+        forms[key] = name
+    return forms[key]
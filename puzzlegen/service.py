@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from puzzlegen.backends import SCRIPTS
+from puzzlegen.batch import _generate_chunk
+
+# Puzzle pool service: python -m puzzlegen serve --pool sudoku:hard ...
+#
+# Each pool is a (type, difficulty) pair, optionally with generate_puzzle
+# options, and keeps a deque of ready puzzles in memory. Whenever a pool
+# drops below its low watermark it is topped back up to the high one by
+# chunks generated on a shared process pool (with fresh random seeds, through
+# the same code path as puzzlegen.batch), so a request only ever pops a
+# puzzle that already exists. The front end is a small HTTP/1.1 server on
+# asyncio, over TCP or a Unix socket:
+#
+#   GET /puzzle?type=sudoku&difficulty=hard
+#       {"type": ..., "difficulty": ..., "puzzle": [...]}, or 503 while the
+#       pool is empty (the miss is counted and a refill is already running)
+#   GET /metrics
+#       per pool: depth, pending (being generated), served, generated,
+#       misses, errors and refill_rate (puzzles per second over the last
+#       RATE_WINDOW seconds, or since startup if that is shorter)
+
+DEFAULT_LOW = 20
+DEFAULT_HIGH = 100
+CHUNK_SIZE = 10
+RATE_WINDOW = 60.0
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+def parse_pool(spec):
+    """Parse 'type:difficulty[:options JSON]' into (type, difficulty, options)."""
+    kind, _, rest = spec.partition(':')
+    difficulty, _, options = rest.partition(':')
+    if kind not in SCRIPTS or not difficulty:
+        raise ValueError(f"Pool '{spec}' should look like type:difficulty, with type one of {sorted(SCRIPTS)}")
+    options = json.loads(options) if options else {}
+    if not isinstance(options, dict):
+        raise ValueError(f"Pool '{spec}' options must be a JSON object")
+    return kind, difficulty, options
+
+
+def jsonable(value):
+    # Puzzles as JSON: boards become lists, and dicts keyed by tuples (the
+    # logic puzzle's solution matrices) are keyed by "r,c" instead. NumPy
+    # arrays and scalars (the word search grid) become plain lists and values
+    if isinstance(value, (bytes, bytearray)):
+        return list(value)
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {','.join(map(str, key)) if isinstance(key, tuple) else str(key): jsonable(item)
+                for key, item in value.items()}
+    return value
+
+
+class Pool:
+    """Ready puzzles and counters for one (type, difficulty) pair."""
+
+    def __init__(self, kind, difficulty, options, low, high):
+        self.kind = kind
+        self.difficulty = difficulty
+        self.options = options
+        self.low = low
+        self.high = high
+        self.ready = deque()
+        self.pending = 0
+        self.served = 0
+        self.generated = 0
+        self.misses = 0
+        self.errors = 0
+        self.last_error = None
+        self.refills = deque()  # (finish time, puzzles) for the refill rate
+        self.task = None
+
+    def metrics(self, now, uptime):
+        while self.refills and self.refills[0][0] < now - RATE_WINDOW:
+            self.refills.popleft()
+        window = min(RATE_WINDOW, uptime) or 1.0
+        return {
+            'type': self.kind,
+            'difficulty': self.difficulty,
+            'options': self.options,
+            'depth': len(self.ready),
+            'pending': self.pending,
+            'low': self.low,
+            'high': self.high,
+            'served': self.served,
+            'generated': self.generated,
+            'misses': self.misses,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'refill_rate': round(sum(count for _, count in self.refills) / window, 3),
+        }
+
+
+class PuzzlePool:
+    """The pools of a service and the process pool that refills them."""
+
+    def __init__(self, specs, workers=None, low=DEFAULT_LOW, high=DEFAULT_HIGH, chunk_size=CHUNK_SIZE):
+        if not 0 <= low < high:
+            raise ValueError("Watermarks need 0 <= low < high")
+        self.pools = {}
+        for kind, difficulty, options in specs:
+            if (kind, difficulty) in self.pools:
+                raise ValueError(f"Pool {kind}:{difficulty} is given twice")
+            self.pools[kind, difficulty] = Pool(kind, difficulty, options, low, high)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.executor = None
+        self.started = time.monotonic()
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        for pool in self.pools.values():
+            self._refill_if_low(pool, force=True)
+
+    async def close(self):
+        tasks = [pool.task for pool in self.pools.values() if pool.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def take(self, kind, difficulty):
+        """Pop a ready puzzle, or return None if the pool is empty.
+
+        Raises KeyError for a (type, difficulty) that has no pool.
+        """
+        pool = self.pools[kind, difficulty]
+        puzzle = pool.ready.popleft() if pool.ready else None
+        if puzzle is None:
+            pool.misses += 1
+        else:
+            pool.served += 1
+        self._refill_if_low(pool)
+        return puzzle
+
+    def put_back(self, kind, difficulty, puzzle):
+        """Return a taken puzzle that could not be sent to the front of its pool."""
+        pool = self.pools[kind, difficulty]
+        pool.ready.appendleft(puzzle)
+        pool.served -= 1
+
+    def metrics(self):
+        now = time.monotonic()
+        return {
+            'uptime': round(now - self.started, 3),
+            'workers': self.workers,
+            'pools': [pool.metrics(now, now - self.started) for pool in self.pools.values()],
+        }
+
+    def _refill_if_low(self, pool, force=False):
+        if pool.task is None and (force or len(pool.ready) < pool.low):
+            pool.task = asyncio.get_running_loop().create_task(self._refill(pool))
+
+    async def _refill(self, pool):
+        # Keep up to one chunk per worker in flight until the pool reaches
+        # its high watermark
+        loop = asyncio.get_running_loop()
+        in_flight = {}
+        try:
+            while True:
+                while len(in_flight) < self.workers and len(pool.ready) + pool.pending < pool.high:
+                    size = min(self.chunk_size, pool.high - len(pool.ready) - pool.pending)
+                    future = loop.run_in_executor(self.executor, _generate_chunk, pool.kind, pool.difficulty,
+                                                  random.getrandbits(64), 0, size, pool.options)
+                    in_flight[future] = size
+                    pool.pending += size
+                if not in_flight:
+                    return
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    pool.pending -= in_flight.pop(future)
+                    try:
+                        puzzles = future.result()
+                    except Exception as e:
+                        # Most likely bad options, which would fail again
+                        # straight away; the next request retries
+                        pool.errors += 1
+                        pool.last_error = f"{type(e).__name__}: {e}"
+                        print(f"{pool.kind}:{pool.difficulty} refill failed: {pool.last_error}", file=sys.stderr)
+                        return
+                    pool.ready.extend(puzzles)
+                    pool.generated += len(puzzles)
+                    pool.refills.append((time.monotonic(), len(puzzles)))
+        finally:
+            for future in in_flight:
+                future.cancel()
+            pool.pending = 0
+            pool.task = None
+
+
+async def _handle(service, reader, writer):
+    # HTTP/1.1 with keep-alive, GET only; just enough for curl and clients
+    # that hold a connection open
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                status, payload = 400, _json({'error': "malformed request line"})
+            elif parts[0] != 'GET':
+                status, payload = 405, _json({'error': "only GET is supported"})
+            else:
+                try:
+                    status, payload = _route(service, parts[1])
+                except Exception as e:
+                    # Answer rather than drop the connection; the client
+                    # may retry
+                    error = f"{type(e).__name__}: {e}"
+                    print(f"{parts[1]} failed: {error}", file=sys.stderr)
+                    status, payload = 500, _json({'error': error})
+
+            keep_alive = headers.get('connection', '').lower() != 'close' and len(parts) == 3 \
+                and parts[2] == 'HTTP/1.1'
+            writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                         f"Content-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\n"
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def _json(body):
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+def _route(service, target):
+    # Returns (status, encoded JSON body)
+    url = urlsplit(target)
+    if url.path == '/metrics':
+        return 200, _json(service.metrics())
+    if url.path != '/puzzle':
+        return 404, _json({'error': f"no such path {url.path}"})
+    query = parse_qs(url.query)
+    kind = query.get('type', [''])[0]
+    difficulty = query.get('difficulty', [''])[0]
+    try:
+        puzzle = service.take(kind, difficulty)
+    except KeyError:
+        return 404, _json({'error': f"no pool for {kind}:{difficulty}"})
+    if puzzle is None:
+        return 503, _json({'error': f"no {kind}:{difficulty} puzzle ready, try again shortly"})
+    # Encoded before the puzzle counts as served, so one that cannot be
+    # sent goes back to the pool
+    try:
+        return 200, _json({'type': kind, 'difficulty': difficulty, 'puzzle': jsonable(puzzle)})
+    except Exception:
+        service.put_back(kind, difficulty, puzzle)
+        raise
+
+
+async def serve(specs, host='127.0.0.1', port=8765, socket_path=None, workers=None,
+                low=DEFAULT_LOW, high=DEFAULT_HIGH, ready=None):
+    """Run the service until cancelled. ready, if given, is called once it listens."""
+    service = PuzzlePool(specs, workers, low, high)
+    service.start()
+    try:
+        def handler(reader, writer):
+            return _handle(service, reader, writer)
+        if socket_path:
+            server = await asyncio.start_unix_server(handler, socket_path)
+            where = socket_path
+        else:
+            server = await asyncio.start_server(handler, host, port)
+            where = f"http://{host}:{server.sockets[0].getsockname()[1]}"
+        print(f"Serving {', '.join(f'{k}:{d}' for k, d in service.pools)} on {where} "
+              f"(watermarks {low}/{high}, {service.workers} workers)")
+        sys.stdout.flush()
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
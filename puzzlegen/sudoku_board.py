@@ -0,0 +1,106 @@
+import math
+from itertools import permutations
+
+# Flat Sudoku boards for any box size.
+#
+# A board with boxes of base x base cells has side = base * base rows,
+# columns, boxes and digits, and is stored as one bytearray of side * side
+# cells in row-major order with 0 for an empty cell: 16 bytes for 4x4, 81
+# for 9x9, 625 for 25x25. Copying one is a single memcpy, and NumPy can view
+# it without a copy (numpy.frombuffer(board, numpy.uint8).reshape(side, side)).
+#
+# Wherever a board is expected, a list of rows or any buffer with one byte
+# per cell (bytes, bytearray, a uint8 NumPy array) is accepted as well.
+#
+# canonical_form() picks one representative of everything a board can be
+# turned into by relabeling its digits, reordering its bands (groups of
+# base rows) and stacks (groups of base columns), and transposing it: of all
+# those boards, the lexicographically smallest once digits are renumbered in
+# order of first appearance. Two boards have the same canonical form exactly
+# when one is a disguised copy of the other.
+
+MAX_BASE = 15  # digits up to 225 still fit in a byte
+
+
+def flatten(board):
+    """Return a new flat bytearray holding board."""
+    if isinstance(board, (list, tuple)):
+        grid = bytearray(value for row in board for value in row)
+    else:
+        view = memoryview(board)
+        if view.itemsize != 1:
+            raise ValueError("Buffer boards must hold one byte per cell")
+        grid = bytearray(view.tobytes())
+    side = side_of(grid)
+    if max(grid, default=0) > side:
+        raise ValueError(f"Board holds a digit larger than {side}")
+    return grid
+
+
+def side_of(board):
+    """Return the side of a flat board, checking it is a valid size."""
+    side = math.isqrt(len(board))
+    base = math.isqrt(side)
+    if not 1 < base <= MAX_BASE or side * side != len(board) or base * base != side:
+        raise ValueError(f"A board of {len(board)} cells is not a square of square boxes")
+    return side
+
+
+def to_rows(board):
+    """Return a flat board as a list of rows of ints."""
+    side = side_of(board)
+    return [list(board[r * side:(r + 1) * side]) for r in range(side)]
+
+
+def transpose(board):
+    side = side_of(board)
+    return bytearray(board[c * side + r] for r in range(side) for c in range(side))
+
+
+def canonical_form(board):
+    """Return the canonical form of board as bytes (see above)."""
+    grid = flatten(board)
+    side = side_of(grid)
+    base = math.isqrt(side)
+    best = [None]
+    for g in (grid, transpose(grid)):
+        for stacks in permutations(range(base)):
+            # Each band's cells, row by row, with the stacks in this order
+            cols = [s * base + c for s in stacks for c in range(base)]
+            bands = [bytes(g[r * side + c] for r in range(b * base, (b + 1) * base) for c in cols)
+                     for b in range(base)]
+            _order_bands(bands, [0] * (side + 1), 0, b'', best)
+    return best[0]
+
+
+def _relabel(cells, labels, used):
+    # Renumber digits in order of first appearance, extending labels
+    out = bytearray(len(cells))
+    for i, value in enumerate(cells):
+        if value:
+            if not labels[value]:
+                used += 1
+                labels[value] = used
+            out[i] = labels[value]
+    return bytes(out), used
+
+
+def _order_bands(bands, labels, used, prefix, best):
+    # Branch and bound over band orders: try each remaining band next, keep
+    # only those giving the smallest continuation (usually just one), and
+    # drop any prefix that is already worse than the best form found
+    if not bands:
+        if best[0] is None or prefix < best[0]:
+            best[0] = prefix
+        return
+    options = []
+    for k, band in enumerate(bands):
+        new_labels = labels[:]
+        text, new_used = _relabel(band, new_labels, used)
+        options.append((text, k, new_labels, new_used))
+    smallest = min(option[0] for option in options)
+    if best[0] is not None and prefix + smallest > best[0][:len(prefix) + len(smallest)]:
+        return
+    for text, k, new_labels, new_used in options:
+        if text == smallest:
+            _order_bands(bands[:k] + bands[k + 1:], new_labels, new_used, prefix + text, best)
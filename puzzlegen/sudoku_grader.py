@@ -0,0 +1,253 @@
+import random
+from itertools import combinations
+
+# Difficulty grader that solves a 9x9 Sudoku the way a person would.
+#
+# The grader keeps a candidate bitmask per cell and repeatedly applies the
+# cheapest technique that makes progress, restarting from the top after each
+# one. The score is the rating of the hardest technique needed, on a scale
+# loosely following Sudoku Explainer. Puzzles that these techniques cannot
+# finish score UNSOLVED_SCORE.
+
+TECHNIQUES = (
+    ('hidden single (box)', 1.2),
+    ('hidden single (line)', 1.5),
+    ('naked single', 2.3),
+    ('pointing', 2.6),
+    ('claiming', 2.8),
+    ('naked pair', 3.0),
+    ('x-wing', 3.2),
+    ('hidden pair', 3.4),
+    ('naked triple', 3.6),
+    ('swordfish', 3.8),
+    ('hidden triple', 4.0),
+)
+RATINGS = dict(TECHNIQUES)
+UNSOLVED_SCORE = 10.0
+
+FULL = 0x1FF
+ROWS = [[r * 9 + c for c in range(9)] for r in range(9)]
+COLS = [[r * 9 + c for r in range(9)] for c in range(9)]
+BOXES = [[(b // 3 * 3 + i // 3) * 9 + b % 3 * 3 + i % 3 for i in range(9)] for b in range(9)]
+LINES = ROWS + COLS
+UNITS = BOXES + ROWS + COLS
+PEERS = [sorted({p for unit in UNITS if i in unit for p in unit} - {i}) for i in range(81)]
+BOX_OF = [r // 3 * 3 + c // 3 for r in range(9) for c in range(9)]
+BITS = [1 << d for d in range(9)]
+
+
+class _Grid:
+    __slots__ = ('cands', 'open')
+
+    def __init__(self, board):
+        self.cands = [FULL] * 81
+        self.open = 81
+        for i, value in enumerate(v for row in board for v in row):
+            if value:
+                if not self.cands[i] >> (value - 1) & 1:
+                    raise ValueError("Board has conflicting givens")
+                self.place(i, 1 << (value - 1))
+
+    def place(self, i, bit):
+        cands = self.cands
+        cands[i] = 0
+        self.open -= 1
+        for p in PEERS[i]:
+            cands[p] &= ~bit
+
+    def eliminate(self, cells, mask):
+        # Remove mask from cells, returning True if anything changed
+        cands = self.cands
+        changed = False
+        for i in cells:
+            if cands[i] & mask:
+                cands[i] &= ~mask
+                changed = True
+        return changed
+
+
+def _hidden_singles(grid, units):
+    cands = grid.cands
+    found = False
+    for unit in units:
+        once = twice = 0
+        for i in unit:
+            twice |= once & cands[i]
+            once |= cands[i]
+        hidden = once & ~twice
+        while hidden:
+            bit = hidden & -hidden
+            hidden ^= bit
+            for i in unit:
+                if cands[i] & bit:
+                    grid.place(i, bit)
+                    found = True
+                    break
+    return found
+
+
+def _naked_singles(grid):
+    cands = grid.cands
+    found = False
+    for i in range(81):
+        cand = cands[i]
+        if cand and not cand & (cand - 1):
+            grid.place(i, cand)
+            found = True
+    return found
+
+
+def _pointing(grid):
+    # A digit confined to one line inside a box is removed from the rest of that line
+    cands = grid.cands
+    for box in BOXES:
+        for bit in BITS:
+            cells = [i for i in box if cands[i] & bit]
+            if len(cells) < 2:
+                continue
+            r, c = cells[0] // 9, cells[0] % 9
+            if all(i // 9 == r for i in cells):
+                line = ROWS[r]
+            elif all(i % 9 == c for i in cells):
+                line = COLS[c]
+            else:
+                continue
+            if grid.eliminate([i for i in line if i not in cells], bit):
+                return True
+    return False
+
+
+def _claiming(grid):
+    # A digit confined to one box inside a line is removed from the rest of that box
+    cands = grid.cands
+    for line in LINES:
+        for bit in BITS:
+            cells = [i for i in line if cands[i] & bit]
+            if len(cells) < 2:
+                continue
+            box = BOX_OF[cells[0]]
+            if all(BOX_OF[i] == box for i in cells):
+                if grid.eliminate([i for i in BOXES[box] if i not in cells], bit):
+                    return True
+    return False
+
+
+def _naked_subset(grid, size):
+    cands = grid.cands
+    for unit in UNITS:
+        open_cells = [i for i in unit if cands[i] and cands[i].bit_count() <= size]
+        for cells in combinations(open_cells, size):
+            mask = 0
+            for i in cells:
+                mask |= cands[i]
+            if mask.bit_count() == size:
+                if grid.eliminate([i for i in unit if i not in cells], mask):
+                    return True
+    return False
+
+
+def _hidden_subset(grid, size):
+    cands = grid.cands
+    for unit in UNITS:
+        places = {}
+        for bit in BITS:
+            cells = [i for i in unit if cands[i] & bit]
+            if 2 <= len(cells) <= size:
+                places[bit] = cells
+        for bits in combinations(places, size):
+            cells = set()
+            for bit in bits:
+                cells.update(places[bit])
+            if len(cells) == size:
+                keep = sum(bits)
+                if grid.eliminate(cells, FULL & ~keep):
+                    return True
+    return False
+
+
+def _fish(grid, size):
+    # X-wing (size 2) and swordfish (size 3), with rows or columns as the base
+    cands = grid.cands
+    for bit in BITS:
+        for base_lines in (ROWS, COLS):
+            lines = []
+            for a, line in enumerate(base_lines):
+                covers = frozenset(k for k, i in enumerate(line) if cands[i] & bit)
+                if 2 <= len(covers) <= size:
+                    lines.append((a, covers))
+            for group in combinations(lines, size):
+                covers = frozenset().union(*(line_covers for _, line_covers in group))
+                if len(covers) != size:
+                    continue
+                base = {a for a, _ in group}
+                others = [x for x in range(9) if x not in base]
+                if base_lines is ROWS:
+                    cells = [x * 9 + k for k in covers for x in others]
+                else:
+                    cells = [k * 9 + x for k in covers for x in others]
+                if grid.eliminate(cells, bit):
+                    return True
+    return False
+
+
+_STEPS = (
+    ('hidden single (box)', lambda grid: _hidden_singles(grid, BOXES)),
+    ('hidden single (line)', lambda grid: _hidden_singles(grid, LINES)),
+    ('naked single', _naked_singles),
+    ('pointing', _pointing),
+    ('claiming', _claiming),
+    ('naked pair', lambda grid: _naked_subset(grid, 2)),
+    ('x-wing', lambda grid: _fish(grid, 2)),
+    ('hidden pair', lambda grid: _hidden_subset(grid, 2)),
+    ('naked triple', lambda grid: _naked_subset(grid, 3)),
+    ('swordfish', lambda grid: _fish(grid, 3)),
+    ('hidden triple', lambda grid: _hidden_subset(grid, 3)),
+)
+
+
+def rate(board, max_score=None):
+    """Grade a 9x9 board, returning (score, {technique: times used}).
+
+    Grading stops early with UNSOLVED_SCORE once a technique rated above
+    max_score would be needed, which keeps the generation loop cheap.
+    """
+    grid = _Grid(board)
+    used = {}
+    score = 0.0
+    while grid.open:
+        for name, step in _STEPS:
+            rating = RATINGS[name]
+            if max_score is not None and rating > max_score:
+                return UNSOLVED_SCORE, used
+            if step(grid):
+                used[name] = used.get(name, 0) + 1
+                score = max(score, rating)
+                break
+        else:
+            return UNSOLVED_SCORE, used
+        if grid.open > len(grid.cands) - grid.cands.count(0):
+            # An open cell ran out of candidates, so the board has no solution
+            return UNSOLVED_SCORE, used
+    return score, used
+
+
+def grade(board, max_score=None):
+    """Return the difficulty score of board (see rate)."""
+    return rate(board, max_score)[0]
+
+
+def dig_rated(solution, min_score, max_score):
+    """Remove clues from a solved board while it grades at or below max_score.
+
+    Returns the dug puzzle if it ends up scoring at least min_score, or None
+    so the caller can retry with a fresh solution. A puzzle these techniques
+    can finish has exactly one solution, so no separate uniqueness check is
+    needed.
+    """
+    board = [row[:] for row in solution]
+    for p in random.sample(range(81), 81):
+        row, col = p // 9, p % 9
+        board[row][col] = 0
+        if grade(board, max_score) > max_score:
+            board[row][col] = solution[row][col]
+    return board if grade(board) >= min_score else None
@@ -0,0 +1,288 @@
+import math
+
+from puzzlegen import dlx, metrics
+from puzzlegen.sudoku_board import flatten, side_of, to_rows
+
+# Bitmask constraint-propagation solver for Sudoku boards of any box size.
+#
+# A board is a flat bytearray (see sudoku_board.py) or a list of rows, with 0
+# for empty cells; solutions come back in the same form. A search node is
+# the flat board as a list, which indexes faster than a bytearray, plus the
+# candidate bitmask of every empty cell (bit d - 1 for digit d). Each node
+# fills naked and hidden singles until nothing changes, then branches on the
+# open cell with the fewest candidates. A child node starts from a copy of
+# its parent's candidates and only follows up on the digit it placed.
+#
+# solve() and count_solutions() can also run on the Dancing Links engine in
+# dlx.py, which has steadier worst-case behaviour. Passing Killer cages
+# switches the bitmask engine over to killer_solver.py. ENGINES lists the
+# accepted engine names.
+
+ENGINES = ('bitmask', 'dlx')
+
+# Budget of a search without a node_limit. Being finite, the nodes a search
+# visited are its starting budget minus what is left, so they can be counted
+# (see puzzlegen.metrics) at no cost per node
+NO_NODE_LIMIT = 1 << 62
+
+_tables_cache = {}
+
+
+class SearchLimitExceeded(Exception):
+    """Raised when a search visits more nodes than its node_limit allows."""
+
+
+def unit_tables(side):
+    """Return the cell, unit and peer lookup tables of a side x side board.
+
+    The tuple is (squares, row_of, col_of, box_of, units, full, peers),
+    built once per side and shared with killer_solver.
+    """
+    if side not in _tables_cache:
+        base = math.isqrt(side)
+        if base * base != side:
+            raise ValueError(f"Board side {side} is not a square number")
+        squares = side * side
+        row_of = [i // side for i in range(squares)]
+        col_of = [i % side for i in range(squares)]
+        box_of = [(r // base) * base + c // base for r, c in zip(row_of, col_of)]
+
+        units = [[r * side + c for c in range(side)] for r in range(side)]
+        units += [[r * side + c for r in range(side)] for c in range(side)]
+        units += [[i for i in range(squares) if box_of[i] == b] for b in range(side)]
+
+        peers = [sorted({p for unit in (units[row_of[i]], units[side + col_of[i]], units[2 * side + box_of[i]])
+                         for p in unit} - {i}) for i in range(squares)]
+
+        full = (1 << side) - 1
+        _tables_cache[side] = (squares, row_of, col_of, box_of, units, full, peers)
+    return _tables_cache[side]
+
+
+def _load(board):
+    # A search node is (grid, cands): the flat board and, for every empty
+    # cell, the bitmask of digits its row, column and box still allow (0 for
+    # filled cells). Returns the root node plus the cells to start
+    # propagating from, or None if the givens already rule every solution out.
+    grid = list(flatten(board))
+    side = side_of(grid)
+    tables = unit_tables(side)
+    squares, row_of, col_of, box_of, units, full, peers = tables
+
+    rows, cols, boxes = [0] * side, [0] * side, [0] * side
+    for i, value in enumerate(grid):
+        if value:
+            bit = 1 << (value - 1)
+            r, c, b = row_of[i], col_of[i], box_of[i]
+            if (rows[r] | cols[c] | boxes[b]) & bit:
+                return None  # The givens already clash
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+
+    cands = [0] * squares
+    singles = []
+    for i in range(squares):
+        if not grid[i]:
+            cand = full & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+            if not cand:
+                return None
+            cands[i] = cand
+            if not cand & (cand - 1):
+                singles.append(i)
+    return grid, cands, tables, singles, bytearray(b'\1') * len(units)
+
+
+def _propagate(grid, cands, tables, singles, dirty):
+    # Fill singles starting from the cells queued in singles and the units
+    # flagged in dirty. Returns -2 on a contradiction, -1 once the board is
+    # full, otherwise the open cell with the fewest candidates.
+    squares, row_of, col_of, box_of, units, full, peers = tables
+    side = len(units) // 3
+
+    while True:
+        # Naked singles: place every cell left with one candidate, taking
+        # its digit out of its peers' candidates and queueing any peer that
+        # is down to one. Only the peers are touched, so a long chain of
+        # singles on a 25x25 board does not rescan the whole grid each time.
+        while singles:
+            i = singles.pop()
+            if grid[i]:
+                continue
+            bit = cands[i]
+            grid[i] = bit.bit_length()
+            cands[i] = 0
+            dirty[row_of[i]] = dirty[side + col_of[i]] = dirty[2 * side + box_of[i]] = 1
+            for q in peers[i]:
+                cand = cands[q]
+                if cand & bit:
+                    cand ^= bit
+                    if not cand:
+                        return -2
+                    cands[q] = cand
+                    if not cand & (cand - 1):
+                        singles.append(q)
+                    dirty[row_of[q]] = dirty[side + col_of[q]] = dirty[2 * side + box_of[q]] = 1
+
+        # Hidden singles: a digit with only one possible cell in a unit,
+        # looked for only in units whose candidates changed since last time
+        for u, unit in enumerate(units):
+            if not dirty[u]:
+                continue
+            dirty[u] = 0
+            once = twice = placed = 0
+            for i in unit:
+                value = grid[i]
+                if value:
+                    placed |= 1 << (value - 1)
+                    continue
+                cand = cands[i]
+                twice |= once & cand
+                once |= cand
+            if placed == full:
+                continue
+            if (once | placed) != full:
+                return -2
+            hidden = once & ~twice & ~placed
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for i in unit:
+                    if cands[i] & bit:
+                        cands[i] = bit
+                        singles.append(i)
+                        break
+                else:
+                    return -2  # the cell was claimed for another digit
+
+        if not singles:
+            break
+
+    best, best_count = -1, full.bit_length() + 1
+    for i in range(squares):
+        cand = cands[i]
+        if cand:
+            count = cand.bit_count()
+            if count < best_count:
+                best, best_count = i, count
+    return best
+
+
+def _branch(grid, cands, tables, cell, cand, limit, found, budget):
+    # Search each digit of cand in cell, from copies of the propagated node
+    units = tables[4]
+    while cand:
+        bit = cand & -cand
+        cand ^= bit
+        g, ca = grid[:], cands[:]
+        ca[cell] = bit
+        _search(g, ca, tables, [cell], bytearray(len(units)), limit, found, budget)
+        if len(found) >= limit:
+            return
+
+
+def _search(grid, cands, tables, singles, dirty, limit, found, budget):
+    budget[0] -= 1
+    if budget[0] < 0:
+        raise SearchLimitExceeded
+    cell = _propagate(grid, cands, tables, singles, dirty)
+    if cell == -2:
+        return
+    if cell == -1:
+        found.append(grid)
+        return
+    _branch(grid, cands, tables, cell, cands[cell], limit, found, budget)
+
+
+def _solutions(board, limit, engine, cages, node_limit=None):
+    as_rows = isinstance(board, (list, tuple))
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown solver engine '{engine}', expected one of {ENGINES}")
+    if engine == 'dlx' or cages:
+        # The Dancing Links and Killer engines work on lists of rows
+        if not as_rows:
+            board = to_rows(flatten(board))
+        if engine == 'dlx':
+            if node_limit is not None:
+                raise ValueError("The dlx engine does not support node_limit")
+            found = dlx.sudoku_solutions(board, limit, cages)
+        else:
+            # Imported here because killer_solver builds on this module's tables
+            from puzzlegen import killer_solver
+            found = killer_solver.solutions(board, cages, limit, node_limit)
+        return found if as_rows else [flatten(solution) for solution in found]
+
+    state = _load(board)
+    if state is None:
+        return []
+    found = []
+    budget = new_budget(node_limit)
+    try:
+        _search(*state, limit, found, budget)
+    finally:
+        record_nodes('sudoku', budget)
+    return [to_rows(grid) for grid in found] if as_rows else [bytearray(grid) for grid in found]
+
+
+def new_budget(node_limit):
+    """Return a search budget, [nodes left, nodes at the start].
+
+    Searches only decrement the first entry and raise SearchLimitExceeded
+    once it goes negative; without a node_limit it starts at NO_NODE_LIMIT.
+    """
+    start = node_limit if node_limit is not None else NO_NODE_LIMIT
+    return [start, start]
+
+
+def record_nodes(name, budget):
+    """Record in metrics how many nodes a finished or aborted search visited."""
+    if metrics.enabled:
+        metrics.count(f"{name}.searches")
+        metrics.count(f"{name}.search_nodes", budget[1] - max(budget[0], 0))
+
+
+def solve(board, engine='bitmask', cages=None):
+    """Return a solved copy of board, or None if it has no solution."""
+    solutions = _solutions(board, 1, engine, cages)
+    return solutions[0] if solutions else None
+
+
+def count_solutions(board, limit=2, engine='bitmask', cages=None, node_limit=None):
+    """Count the solutions of board, stopping as soon as limit are found.
+
+    With node_limit set, the bitmask engine (and the Killer solver it hands
+    cages to) raises SearchLimitExceeded once it has visited that many
+    search nodes; the dlx engine rejects a node_limit with ValueError.
+    """
+    return len(_solutions(board, limit, engine, cages, node_limit))
+
+
+def is_forced(board, cell, value, node_limit=None):
+    """Return True if every solution of board has value in the empty cell.
+
+    Used when digging holes into a puzzle with a single solution: emptying a
+    cell keeps it unique exactly when the old digit is forced, and ruling
+    out the other digits is a much smaller search than counting solutions,
+    which would first have to find the known one again. cell is a flat
+    index; node_limit works as for count_solutions.
+    """
+    state = _load(board)
+    if state is None:
+        return True
+    # Singles alone usually put the digit straight back, most often at once
+    # as the cell's only candidate; otherwise every alternative starts from
+    # what they did fill in
+    grid, cands, tables, singles, dirty = state
+    if cands[cell] == 1 << (value - 1):
+        return True
+    if _propagate(grid, cands, tables, singles, dirty) == -2:
+        return True
+    if grid[cell]:
+        return grid[cell] == value
+    found = []
+    budget = new_budget(node_limit)
+    try:
+        _branch(grid, cands, tables, cell, cands[cell] & ~(1 << (value - 1)), 1, found, budget)
+    finally:
+        record_nodes('sudoku', budget)
+    return not found
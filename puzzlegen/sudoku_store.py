@@ -0,0 +1,192 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from puzzlegen.sudoku_board import canonical_form, flatten
+
+# On-disk stock of generated Sudoku puzzles, in a single SQLite file.
+#
+# Every puzzle is keyed by a digest of its canonical form (see
+# sudoku_board.canonical_form), so a puzzle that is only a relabeled,
+# band-swapped or transposed copy of one already stored is turned away by
+# the unique index when it is added. Puzzles are filed under the difficulty
+# and generate_puzzle options (base, unique, rated...) they were made with;
+# take() hands out the oldest unserved ones for a (difficulty, options) pair
+# through the stock index and marks them served in the same transaction, so
+# no puzzle is shipped twice, whether it came from stock or was generated
+# and added as served on the spot.
+#
+# A caller that may still fail to ship its puzzles reserves them instead,
+# with reserve() or add_reserved(): reserved puzzles are out of stock for
+# everyone else, and settle() then marks them served once they are shipped
+# or puts them back in stock if they never were.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS puzzles (
+    id INTEGER PRIMARY KEY,
+    canonical BLOB NOT NULL UNIQUE,
+    difficulty TEXT NOT NULL,
+    options TEXT NOT NULL,
+    puzzle BLOB NOT NULL,
+    solution BLOB NOT NULL,
+    served INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stock ON puzzles (difficulty, options, served, id);
+"""
+
+# The Sudoku script's generate_puzzle defaults, filled in before options are
+# stored so that leaving an option out and passing its default file the
+# same puzzles
+OPTION_DEFAULTS = {'unique': False, 'rated': False, 'base': 3}
+
+# Values of the served column
+UNSERVED, SERVED, RESERVED = 0, 1, 2
+
+# PRAGMA user_version of an up to date file; older files are migrated once
+# when opened
+SCHEMA_VERSION = 1
+
+
+def canonical_key(puzzle):
+    """Return the 16-byte key a puzzle is deduplicated by."""
+    return hashlib.blake2b(canonical_form(puzzle), digest_size=16).digest()
+
+
+def options_key(options=None):
+    # generate_puzzle options as stored, with the defaults filled in
+    return json.dumps({**OPTION_DEFAULTS, **(options or {})}, sort_keys=True)
+
+
+class PuzzleStore:
+    """A Sudoku stock file; usable as a context manager that closes it."""
+
+    def __init__(self, path):
+        # Autocommit mode, with transactions opened explicitly, so take() can
+        # claim its puzzles before another process or thread reads them
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        if self._version() < SCHEMA_VERSION:
+            self._migrate()
+
+    def _version(self):
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def _migrate(self):
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Checked again under the lock, in case another process got here first
+            if self._version() < 1:
+                # Files written before the defaults were filled in keep their puzzles
+                for (stored,) in cursor.execute("SELECT DISTINCT options FROM puzzles").fetchall():
+                    key = options_key(json.loads(stored))
+                    if key != stored:
+                        cursor.execute("UPDATE puzzles SET options = ? WHERE options = ?", (key, stored))
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def contains(self, puzzle):
+        """Return True if puzzle, or a disguised copy of it, is stored."""
+        row = self.connection.execute("SELECT 1 FROM puzzles WHERE canonical = ?",
+                                      (canonical_key(puzzle),)).fetchone()
+        return row is not None
+
+    def add(self, puzzle, solution, difficulty, options=None, served=False):
+        """Store one puzzle, returning False if it was a duplicate."""
+        return self.add_many([(puzzle, solution)], difficulty, options, served) == 1
+
+    def add_reserved(self, puzzle, solution, difficulty, options=None):
+        """Store one puzzle as reserved, returning its id, or None if it was a duplicate."""
+        ids = self._insert([(puzzle, solution)], difficulty, options, RESERVED)
+        return ids[0] if ids else None
+
+    def add_many(self, pairs, difficulty, options=None, served=False):
+        """Store (puzzle, solution) pairs in one transaction; returns how many were new."""
+        return len(self._insert(pairs, difficulty, options, SERVED if served else UNSERVED))
+
+    def _insert(self, pairs, difficulty, options, served):
+        # The ids of the rows that were new
+        options = options_key(options)
+        now = time.time()
+        # Keys are worked out before the write lock is taken
+        rows = []
+        for puzzle, solution in pairs:
+            puzzle, solution = flatten(puzzle), flatten(solution)
+            if len(puzzle) != len(solution):
+                raise ValueError("Puzzle and solution differ in size")
+            rows.append((canonical_key(puzzle), difficulty, options, bytes(puzzle), bytes(solution), served, now))
+
+        ids = []
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO puzzles (canonical, difficulty, options, puzzle, solution, served, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                if cursor.rowcount:
+                    ids.append(cursor.lastrowid)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return ids
+
+    def stock(self, difficulty=None, options=None):
+        """Count unserved puzzles, optionally for one difficulty and options."""
+        if difficulty is None:
+            query, args = "SELECT COUNT(*) FROM puzzles WHERE served = 0", ()
+        else:
+            query = "SELECT COUNT(*) FROM puzzles WHERE difficulty = ? AND options = ? AND served = 0"
+            args = (difficulty, options_key(options))
+        return self.connection.execute(query, args).fetchone()[0]
+
+    def take(self, difficulty, count, options=None):
+        """Mark up to count unserved puzzles served and return them as (puzzle, solution) pairs."""
+        return [pair for _, pair in self._claim(difficulty, count, options, SERVED)]
+
+    def reserve(self, difficulty, count, options=None):
+        """Reserve up to count unserved puzzles, returning them as (id, (puzzle, solution)) pairs."""
+        return self._claim(difficulty, count, options, RESERVED)
+
+    def _claim(self, difficulty, count, options, served):
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            rows = cursor.execute(
+                "SELECT id, puzzle, solution FROM puzzles WHERE difficulty = ? AND options = ? AND served = 0"
+                " ORDER BY id LIMIT ?", (difficulty, options_key(options), count)).fetchall()
+            cursor.executemany("UPDATE puzzles SET served = ? WHERE id = ?", [(served, row[0]) for row in rows])
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return [(row_id, (bytearray(puzzle), bytearray(solution))) for row_id, puzzle, solution in rows]
+
+    def settle(self, ids, served):
+        """Mark reserved puzzles served, or return them to stock if served is False."""
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany("UPDATE puzzles SET served = ? WHERE id = ? AND served = ?",
+                               [(SERVED if served else UNSERVED, row_id, RESERVED) for row_id in ids])
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
@@ -0,0 +1,166 @@
+import mmap
+import os
+import random
+import struct
+
+import numpy as np
+
+# Word lists compiled into a memory-mapped index, so drawing a few words from
+# a dictionary with millions of entries does not mean reading all of it.
+#
+# The index file sits next to the word list (words.txt -> words.txt.idx) and
+# holds, after a fixed header:
+#
+#   lengths  one record per word length, giving the range of words that long
+#   masks    the letter mask of every word: bit k set for the k-th letter of
+#            the alphabet, bit 26 for anything else
+#   offsets  word_count + 1 byte offsets into the blob
+#   blob     the upper-cased words, newline separated
+#
+# Words are sorted by length and then by letter mask, so a length filter is
+# a contiguous range and sampling n words from it reads n offsets and n
+# slices of the blob. Letter filters scan only the masks of that range. The
+# header records the size and mtime of the source list, and the index is
+# rebuilt when they no longer match.
+
+MAGIC = b'PZWL'
+VERSION = 1
+HEADER = struct.Struct('<4sIQqQQQ')  # magic, version, source size, source mtime, words, lengths, blob bytes
+LENGTH_DTYPE = np.dtype([('length', '<u4'), ('start', '<u8'), ('count', '<u8')])
+OTHER_BIT = 1 << 26
+
+_open_lists = {}
+
+
+def letter_mask(word):
+    """Return the bitmask of letters used by an upper-case word."""
+    mask = 0
+    for ch in word:
+        k = ord(ch) - 65
+        mask |= 1 << k if 0 <= k < 26 else OTHER_BIT
+    return mask
+
+
+def index_path(path):
+    return path + '.idx'
+
+
+def compile_index(path, out_path=None):
+    """Build the index file for a word list and return its path.
+
+    Words are upper-cased and de-duplicated, and blank lines are skipped.
+    """
+    out_path = out_path or index_path(path)
+    stat = os.stat(path)
+    with open(path, 'r') as file:
+        words = {line.strip().upper() for line in file}
+    words.discard('')
+
+    keyed = sorted((len(word), letter_mask(word), word) for word in words)
+    lengths = []
+    masks = np.empty(len(keyed), dtype='<u4')
+    offsets = np.empty(len(keyed) + 1, dtype='<u8')
+    blob = bytearray()
+    for i, (length, mask, word) in enumerate(keyed):
+        if not lengths or lengths[-1][0] != length:
+            lengths.append([length, i, 0])
+        lengths[-1][2] += 1
+        masks[i] = mask
+        offsets[i] = len(blob)
+        blob += word.encode('utf-8') + b'\n'
+    offsets[len(keyed)] = len(blob)
+    table = np.array([tuple(entry) for entry in lengths], dtype=LENGTH_DTYPE)
+
+    # Written under a temporary name so readers never see a partial index
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, stat.st_size, stat.st_mtime_ns, len(keyed), len(table), len(blob)))
+        out.write(table.tobytes())
+        out.write(masks.tobytes())
+        out.write(offsets.tobytes())
+        out.write(blob)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class WordList:
+    """A compiled word list, mapped read-only from its index file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.source_size, self.source_mtime, count, num_lengths, blob_size = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} word index")
+        pos = HEADER.size
+        self.lengths = np.frombuffer(self._map, LENGTH_DTYPE, num_lengths, pos)
+        pos += self.lengths.nbytes
+        self.masks = np.frombuffer(self._map, '<u4', count, pos)
+        pos += self.masks.nbytes
+        self.offsets = np.frombuffer(self._map, '<u8', count + 1, pos)
+        self._blob = pos + self.offsets.nbytes
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def word(self, i):
+        start, stop = int(self.offsets[i]), int(self.offsets[i + 1]) - 1
+        return self._map[self._blob + start:self._blob + stop].decode('utf-8')
+
+    def length_range(self, min_length=1, max_length=None):
+        """Return the (start, stop) word indices of words within the lengths."""
+        lengths = self.lengths
+        keep = lengths['length'] >= min_length
+        if max_length is not None:
+            keep &= lengths['length'] <= max_length
+        selected = lengths[keep]
+        if not len(selected):
+            return 0, 0
+        return int(selected['start'][0]), int(selected['start'][-1] + selected['count'][-1])
+
+    def sample(self, n, min_length=1, max_length=None, letters=None, required=None):
+        """Draw n distinct words that pass the filters, using the random module.
+
+        letters limits words to those letters, required to words containing
+        all of them.
+        """
+        start, stop = self.length_range(min_length, max_length)
+        if letters is None and required is None:
+            total = stop - start
+            if n > total:
+                raise ValueError(f"Only {total} words match, cannot sample {n}")
+            return [self.word(start + i) for i in random.sample(range(total), n)]
+
+        masks = self.masks[start:stop]
+        keep = np.ones(len(masks), dtype=bool)
+        if letters is not None:
+            keep &= (masks & ~np.uint32(letter_mask(letters.upper()))) == 0
+        if required is not None:
+            need = np.uint32(letter_mask(required.upper()))
+            keep &= (masks & need) == need
+        matches = np.flatnonzero(keep)
+        if n > len(matches):
+            raise ValueError(f"Only {len(matches)} words match, cannot sample {n}")
+        return [self.word(start + int(matches[i])) for i in random.sample(range(len(matches)), n)]
+
+
+def open_word_list(path):
+    """Return the WordList for a plain word list, compiling its index if needed.
+
+    Opened lists are kept for the life of the process.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _open_lists:
+        try:
+            words = WordList(index_path(path))
+        except (OSError, ValueError, struct.error):
+            words = None  # missing, truncated or from another version
+        if words is not None and (words.source_size, words.source_mtime) != (stat.st_size, stat.st_mtime_ns):
+            words = None
+        if words is None:
+            words = WordList(compile_index(path))
+        _open_lists[key] = words
+    return _open_lists[key]
@@ -0,0 +1,158 @@
+import random
+from collections import deque
+
+# Multi-pattern scanning of letter grids, used to keep word search fill
+# letters from spelling a second copy of a hidden word or a blocked word.
+#
+# A Scanner is an Aho-Corasick automaton over a set of words and their
+# reversals, so running it once along every row, column and diagonal finds
+# the words in all eight reading directions. The hidden words and the block
+# list share one automaton, each match tagged TARGET or BLOCKED, so every
+# line is scanned once for both. After the fill letters are scanned, each
+# offending match gets one of its fill cells redrawn with a letter that
+# spells nothing new, checked by scanning only the stretch of the four
+# lines through that cell that a pattern could reach. The total work is
+# linear in the grid size, whatever the number of patterns.
+
+# Kinds of match: a hidden word, which is fine where it was placed, and a
+# block list word, which is never fine
+TARGET = 'target'
+BLOCKED = 'blocked'
+
+_grid_lines = {}
+
+
+class Scanner:
+    """Aho-Corasick automaton matching words forwards and backwards.
+
+    words are matched as TARGET and blocked as BLOCKED; a word in both is
+    reported once for each.
+    """
+
+    __slots__ = ('goto', 'fail', 'out', 'longest')
+
+    def __init__(self, words, blocked=()):
+        # Built for every puzzle, so the loops work on local names
+        self.goto = goto = [{}]
+        self.out = out = [()]
+        longest = 0
+        # dict.fromkeys rather than set, so the match order (and with it
+        # which cells get redrawn) does not depend on PYTHONHASHSEED
+        for kind, group in ((TARGET, words), (BLOCKED, blocked)):
+            for word in dict.fromkeys(group):
+                for pattern in dict.fromkeys((word, word[::-1])):
+                    state = 0
+                    for ch in pattern:
+                        nxt = goto[state].get(ch)
+                        if nxt is None:
+                            nxt = goto[state][ch] = len(goto)
+                            goto.append({})
+                            out.append(())
+                        state = nxt
+                    out[state] += ((word, len(pattern), kind),)
+                longest = max(longest, len(word))
+        self.longest = longest
+
+        # Failure links in breadth-first order, folding each state's suffix
+        # matches into its own output
+        self.fail = fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = fail[nxt] = goto[f].get(ch, 0)
+                if out[f]:
+                    out[nxt] += out[f]
+                queue.append(nxt)
+
+    def scan(self, letters, cells):
+        """Yield (word, matched cells, kind) for every match along one line."""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(letters):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for word, length, kind in out[state]:
+                yield word, cells[i - length + 1:i + 1], kind
+
+
+def grid_lines(size):
+    """Return (lines, lines through each cell) for a size x size grid.
+
+    lines are the rows, columns, diagonals and anti-diagonals as lists of
+    flat indices; each cell maps to a list of (line, position) pairs.
+    """
+    if size not in _grid_lines:
+        lines = [[r * size + c for c in range(size)] for r in range(size)]
+        lines += [[r * size + c for r in range(size)] for c in range(size)]
+        for d in range(-(size - 1), size):
+            lines.append([r * size + r - d for r in range(size) if 0 <= r - d < size])
+            lines.append([r * size + d + size - 1 - r for r in range(size) if 0 <= d + size - 1 - r < size])
+        through = [[] for _ in range(size * size)]
+        for k, line in enumerate(lines):
+            for pos, p in enumerate(line):
+                through[p].append((k, pos))
+        _grid_lines[size] = (lines, through)
+    return _grid_lines[size]
+
+
+def clean_fill(letters, size, fill_cells, scanner, allowed, alphabet, max_refills=10000):
+    """Redraw fill letters until scanner finds no unwanted match.
+
+    letters is the flat grid as a list of single letters and is changed in
+    place. fill_cells are the positions that may be redrawn and allowed the
+    frozensets of cells where a TARGET match is expected (the placed words);
+    BLOCKED matches are unwanted anywhere. Matches made only of placed
+    letters cannot be fixed here and are left alone. Returns the number of
+    letters redrawn.
+    """
+    lines, through = grid_lines(size)
+    fill_cells = set(fill_cells)
+
+    def offending(matches):
+        for word, cells, kind in matches:
+            if (kind == BLOCKED or frozenset(cells) not in allowed) and not fill_cells.isdisjoint(cells):
+                yield word, cells
+
+    reach = scanner.longest - 1
+
+    def matches_through(p):
+        # Offending matches that use cell p, found by scanning only the part
+        # of each line through p that a pattern could reach
+        found = []
+        for k, pos in through[p]:
+            line = lines[k][max(0, pos - reach):pos + reach + 1]
+            text = [letters[q] for q in line]
+            found.extend((word, cells) for word, cells in offending(scanner.scan(text, line)) if p in cells)
+        return found
+
+    queue = deque()
+    for line in lines:
+        text = [letters[p] for p in line]
+        queue.extend(offending(scanner.scan(text, line)))
+
+    refills = 0
+    while queue:
+        word, cells = queue.popleft()
+        text = ''.join(letters[p] for p in cells)
+        if text != word and text != word[::-1]:
+            continue  # already broken up by an earlier refill
+        refills += 1
+        if refills > max_refills:
+            raise ValueError("Could not clear unwanted words from the fill letters")
+
+        # Take the first letter, in random order, that makes nothing new
+        # through the cell; if every letter does, keep the last and let the
+        # queue deal with what it made
+        p = random.choice([p for p in cells if p in fill_cells])
+        for letter in random.sample(alphabet, len(alphabet)):
+            letters[p] = letter
+            found = matches_through(p)
+            if not found:
+                break
+        queue.extend(found)
+    return refills